@@ -0,0 +1,284 @@
+import argparse
+import json
+import math
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import simulation
+from chunks import ChunkMap
+from instrument import Profiler
+from simulation import World, Human
+
+# Humans per run and how many ticks to time at that size
+SIZES = {10: 2000, 100: 1000, 1000: 200, 10000: 20, 100000: 3}
+# Ticks run before timing starts
+WARMUP_TICKS = 5
+# Ticks run under tracemalloc for the peak memory figure
+MEMORY_TICKS = 2
+
+PHASES = ('stats', 'seeking', 'breeding', 'movement', 'cleanup')
+
+
+def scaled_world(humans):
+    # World arguments for a population: resources and area grow with it in
+    # the same ratios as the default world, so every size is as crowded as
+    # the default one
+    scale = max(1, humans // 10)
+    side = math.sqrt(scale)
+    return {'num_humans': humans, 'num_puddles': 5 * scale, 'num_plants': 10 * scale, 'num_animals': 5 * scale,
+            'width': round(simulation.WIDTH * side), 'height': round(simulation.HEIGHT * side)}
+
+
+def make_world(engine, humans, seed):
+    # Seeded world whose humans start at mixed ages and stats, so that every
+    # phase has work to do from the first tick
+    counts = scaled_world(humans)
+    if engine == 'vector':
+        import numpy as np
+        from vector_engine import VectorWorld
+
+        world = VectorWorld(seed=seed, **counts)
+        rng = np.random.default_rng([seed, 1])
+        n = len(world)
+        world.age = rng.integers(0, 40, n, endpoint=True)
+        world.water = rng.uniform(60, 100, n)
+        world.hunger = rng.uniform(40, 100, n)
+        world.energy = rng.uniform(40, 100, n)
+        world.last_breed_time[:] = -simulation.BREED_COOLDOWN
+        return world
+
+    world = World(seed=seed, **counts)
+    rng = random.Random(f"{seed}:benchmark")
+    for human in world.humans:
+        human.age = rng.randint(0, 40)
+        human.water = rng.uniform(60, 100)
+        human.hunger = rng.uniform(40, 100)
+        human.energy = rng.uniform(40, 100)
+        human.retime(world.settings)
+        human.last_breed_time = -simulation.BREED_COOLDOWN
+    return world
+
+
+def phase_methods(engine):
+    # (owner, method name, phase) for the steps of a tick that are called
+    # once per tick, so timing them costs next to nothing
+    if engine == 'vector':
+        from vector_engine import VectorWorld
+
+        return [
+            (VectorWorld, 'update_stats', 'stats'),
+            (VectorWorld, 'seek_water', 'seeking'),
+            (VectorWorld, 'seek_food', 'seeking'),
+            (VectorWorld, 'breed', 'breeding'),
+            (VectorWorld, 'random_movement', 'movement'),
+            (VectorWorld, 'keep_humans', 'cleanup'),
+            (VectorWorld, 'add_humans', 'cleanup'),
+            (VectorWorld, 'move_animals', 'movement'),
+            (VectorWorld, 'respawn', 'cleanup'),
+        ]
+    return [
+        (World, 'wake_due', 'stats'),
+        (World, 'age_humans', 'stats'),
+        (World, 'batch_nearest', 'seeking'),
+        (World, 'assign_food', 'seeking'),
+        (World, 'compact', 'cleanup'),
+        (World, 'move_animals', 'movement'),
+        (World, 'respawn', 'cleanup'),
+        (World, 'rebalance_grids', 'cleanup'),
+        (ChunkMap, 'refresh', 'cleanup'),
+    ]
+
+
+def split_methods(engine):
+    # (owner, method name, phase, inner methods) for the steps that work
+    # through the humans one by one and so mix phases. Each is timed as a
+    # whole like the ones above; its time is then shared out among the
+    # phases of its inner (owner, method name, phase) methods in the
+    # proportions they take in a second pass that times every call, and
+    # the rest, the loop and grid upkeep, goes to phase.
+    if engine == 'vector':
+        return []
+    return [
+        (World, 'move_humans', 'movement', [
+            (Human, 'update_stats', 'stats'),
+            (Human, 'seek_water', 'seeking'),
+            (Human, 'seek_food', 'seeking'),
+            (Human, 'breed', 'breeding'),
+            (Human, 'random_movement', 'movement'),
+        ]),
+        (World, 'resolve_contacts', 'seeking', [
+            (Human, 'mate_with', 'breeding'),
+        ]),
+    ]
+
+
+def timed_pass(engine, humans, ticks, seed, targets):
+    # (seconds per tick by label, seconds per tick in all) over ticks of a
+    # fresh world with targets timed. The timers cost time themselves, so
+    # these passes never feed ticks/s.
+    world = make_world(engine, humans, seed)
+    for _ in range(WARMUP_TICKS):
+        world.step()
+    profiler = Profiler()
+    profiler.enable(targets)
+    try:
+        start = time.perf_counter()
+        for _ in range(ticks):
+            world.step()
+        seconds = time.perf_counter() - start
+    finally:
+        profiler.disable()
+    return {label: total / ticks for label, total in profiler.seconds.items()}, seconds / ticks
+
+
+def phase_times(engine, humans, ticks, seed):
+    # Seconds per tick of every phase, plus whatever step does between them
+    methods = phase_methods(engine)
+    split = split_methods(engine)
+    coarse = [(owner, name, name) for owner, name, _ in methods] + [(owner, name, name) for owner, name, _, _ in split]
+    times, total = timed_pass(engine, humans, ticks, seed, coarse)
+    phases = dict.fromkeys(PHASES, 0.0)
+    for _, name, phase in methods:
+        phases[phase] += times.get(name, 0.0)
+
+    if split:
+        fine = []
+        for owner, name, _, inner in split:
+            fine.append((owner, name, name))
+            fine += [(inner_owner, inner_name, f"{name}:{phase}") for inner_owner, inner_name, phase in inner]
+        shares, _ = timed_pass(engine, humans, ticks, seed, fine)
+        for _, name, rest, inner in split:
+            whole = shares.get(name, 0.0)
+            left = 1.0
+            for phase in {phase for _, _, phase in inner}:
+                share = shares.get(f"{name}:{phase}", 0.0) / whole if whole else 0.0
+                phases[phase] += times.get(name, 0.0) * share
+                left -= share
+            phases[rest] += times.get(name, 0.0) * max(0.0, left)
+
+    phases['other'] = max(0.0, total - sum(phases.values()))
+    return phases
+
+
+def bench_size(engine, humans, ticks, seed):
+    # Ticks per second from a clean pass
+    world = make_world(engine, humans, seed)
+    for _ in range(WARMUP_TICKS):
+        world.step()
+    start = time.perf_counter()
+    for _ in range(ticks):
+        world.step()
+    seconds = time.perf_counter() - start
+
+    # Per-phase time from instrumented passes over the same workload
+    phases = phase_times(engine, humans, ticks, seed)
+
+    # Memory held by a freshly built world, and the peak over building it and
+    # running a couple of ticks
+    tracemalloc.start()
+    world = make_world(engine, humans, seed)
+    world_bytes, _ = tracemalloc.get_traced_memory()
+    for _ in range(MEMORY_TICKS):
+        world.step()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'humans': humans,
+        **{name.replace('num_', ''): value for name, value in scaled_world(humans).items() if name != 'num_humans'},
+        'ticks': ticks,
+        'final_population': len(world),
+        'seconds': seconds,
+        'ticks_per_second': ticks / seconds,
+        'phase_seconds_per_tick': phases,
+        'peak_memory_bytes': peak,
+        'world_bytes_per_human': world_bytes / humans,
+    }
+
+
+def compare(results, baseline):
+    # Before -> after lines for every size present in both runs
+    previous = {run['humans']: run for run in baseline['results']}
+    lines = []
+    for run in results:
+        old = previous.get(run['humans'])
+        if old is None:
+            continue
+        line = (f"{run['humans']:>7} humans  ticks/s {old['ticks_per_second']:.1f} -> {run['ticks_per_second']:.1f} "
+                f"({run['ticks_per_second'] / old['ticks_per_second'] - 1:+.0%})  "
+                f"peak {old['peak_memory_bytes'] / 2 ** 20:.1f} -> {run['peak_memory_bytes'] / 2 ** 20:.1f} MiB")
+        if 'world_bytes_per_human' in old:
+            line += f"  world {old['world_bytes_per_human']:.0f} -> {run['world_bytes_per_human']:.0f} B/human"
+        lines.append(line)
+    return lines
+
+
+def find_regressions(results, baseline, tolerance):
+    # Phases and tick rates more than tolerance worse than the baseline file
+    previous = {run['humans']: run for run in baseline['results']}
+    regressions = []
+    for run in results:
+        old = previous.get(run['humans'])
+        if old is None:
+            continue
+        if run['ticks_per_second'] < old['ticks_per_second'] * (1 - tolerance):
+            regressions.append(f"{run['humans']} humans: ticks/s {old['ticks_per_second']:.1f} -> {run['ticks_per_second']:.1f}")
+        for phase, seconds in run['phase_seconds_per_tick'].items():
+            before = old['phase_seconds_per_tick'].get(phase)
+            if before and seconds > before * (1 + tolerance):
+                regressions.append(f"{run['humans']} humans: {phase} {before * 1000:.3f} -> {seconds * 1000:.3f} ms/tick")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless ticks/s benchmark across population sizes")
+    parser.add_argument('--engine', choices=('object', 'vector'), default='object')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES))
+    parser.add_argument('--ticks', type=int, help="ticks per size (default depends on size)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--baseline', help="earlier results file to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    results = []
+    for humans in args.sizes:
+        ticks = args.ticks or SIZES.get(humans, max(3, 200000 // humans))
+        run = bench_size(args.engine, humans, ticks, args.seed)
+        results.append(run)
+        phases = ' '.join(f"{phase}={seconds * 1000:.3f}" for phase, seconds in run['phase_seconds_per_tick'].items())
+        print(f"{humans:>7} humans  {run['ticks_per_second']:>9.1f} ticks/s  "
+              f"peak {run['peak_memory_bytes'] / 2 ** 20:.1f} MiB  "
+              f"world {run['world_bytes_per_human']:.0f} B/human  ms/tick: {phases}", flush=True)
+
+    report = {
+        'engine': args.engine,
+        'seed': args.seed,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"compared with {args.baseline}:")
+        for line in compare(results, baseline):
+            print(line)
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+    return 0
+
+
+# python benchmark.py [--engine object|vector] [--sizes 10 100 ...] [--baseline old.json]
+if __name__ == "__main__":
+    sys.exit(main())
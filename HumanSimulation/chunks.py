@@ -0,0 +1,85 @@
+from spatial import SpatialGrid, value_key
+
+# Side of a chunk in world pixels
+CHUNK_SIZE = 256
+
+# How often a chunk is simulated, from its distance in chunks to the nearest
+# chunk with a human in it: every tick within ACTIVE_RADIUS, every
+# IDLE_INTERVAL ticks (in one bigger step) within IDLE_RADIUS, never beyond
+ACTIVE, IDLE, FROZEN = 0, 1, 2
+ACTIVE_RADIUS = 3
+IDLE_RADIUS = 6
+IDLE_INTERVAL = 10
+# Ticks between activity refreshes; humans cover well under a chunk meanwhile
+ACTIVITY_INTERVAL = 60
+
+
+# ChunkMap Class
+# The world cut into fixed CHUNK_SIZE squares. Each kind of entity and
+# resource has one SpatialGrid whose cells are the chunks, so a chunk's
+# humans, animals, plants and puddles are the buckets at its (cx, cy). Unlike
+# the nearest-target grids these never rebalance, so a chunk stays the same
+# patch of ground; the viewer draws from them and the activity levels decide
+# which animals move.
+class ChunkMap:
+    def __init__(self, width, height, puddles, plants, size=CHUNK_SIZE):
+        self.size = size
+        self.cols = int(width // size) + 1
+        self.rows = int(height // size) + 1
+        self.humans = SpatialGrid(size)
+        self.animals = SpatialGrid(size)
+        self.puddles = SpatialGrid(size, position=puddles.position, key=value_key)
+        self.plants = SpatialGrid(size, position=plants.position, key=value_key)
+        # Level of every chunk that is not ACTIVE; the rest are active
+        self.levels = {}
+        self.all_active = True
+
+    def refresh(self):
+        # Recompute every chunk's level from the chunks humans are in now. In
+        # a world no more than ACTIVE_RADIUS + 1 chunks across, like the
+        # default one, every chunk stays active as long as anyone is alive.
+        distance = {}
+        for cx, cy in self.humans.cells:
+            for gx in range(max(0, cx - IDLE_RADIUS), min(self.cols, cx + IDLE_RADIUS + 1)):
+                for gy in range(max(0, cy - IDLE_RADIUS), min(self.rows, cy + IDLE_RADIUS + 1)):
+                    d = max(abs(gx - cx), abs(gy - cy))
+                    if d < distance.get((gx, gy), IDLE_RADIUS + 1):
+                        distance[(gx, gy)] = d
+        self.levels = {
+            (cx, cy): IDLE if distance.get((cx, cy), IDLE_RADIUS + 1) <= IDLE_RADIUS else FROZEN
+            for cx in range(self.cols) for cy in range(self.rows)
+            if distance.get((cx, cy), IDLE_RADIUS + 1) > ACTIVE_RADIUS
+        }
+        self.all_active = not self.levels
+
+    def due_animals(self, tick):
+        # (steps, animals) for every chunk whose animals move this tick: one
+        # step in active chunks, IDLE_INTERVAL steps at once in idle chunks
+        # on every IDLE_INTERVAL-th tick, none in frozen chunks. The animals
+        # are copied out before any of them moves, so one crossing into
+        # another chunk is not moved twice.
+        idle_due = tick % IDLE_INTERVAL == 0
+        levels = self.levels
+        due = []
+        for cell, bucket in self.animals.cells.items():
+            level = levels.get(cell, ACTIVE)
+            if level == ACTIVE:
+                due.append((1, list(bucket.values())))
+            elif level == IDLE and idle_due:
+                due.append((IDLE_INTERVAL, list(bucket.values())))
+        return due
+
+    def in_view(self, grid, left, top, right, bottom):
+        # Items of one of the grids above in the chunks overlapping the
+        # rectangle; callers still clip what pokes out of it
+        if not grid.count:
+            return []
+        size = self.size
+        found = []
+        cells = grid.cells
+        for cx in range(max(grid.min_cx, int(left // size)), min(grid.max_cx, int(right // size)) + 1):
+            for cy in range(max(grid.min_cy, int(top // size)), min(grid.max_cy, int(bottom // size)) + 1):
+                bucket = cells.get((cx, cy))
+                if bucket is not None:
+                    found.extend(bucket.values())
+        return found
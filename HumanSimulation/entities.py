@@ -0,0 +1,46 @@
+# EntityStore Class
+# Ordered collection of entities with O(1) add, membership and removal, keyed
+# by object identity. Removing an entity only leaves a hole in its slot;
+# compact() squeezes the holes out in one pass, once per tick, so the hot loop
+# never shifts or copies the whole list.
+class EntityStore:
+    def __init__(self, items=()):
+        self.items = []
+        self.slots = {}
+        for item in items:
+            self.add(item)
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, item):
+        return id(item) in self.slots
+
+    def __iter__(self):
+        # Entities added while iterating are not visited until the next pass
+        items = self.items
+        for i in range(len(items)):
+            item = items[i]
+            if item is not None:
+                yield item
+
+    def add(self, item):
+        self.slots[id(item)] = len(self.items)
+        self.items.append(item)
+
+    def remove(self, item):
+        self.items[self.slots.pop(id(item))] = None
+
+    def compact(self):
+        if len(self.items) == len(self.slots):
+            return
+        self.items = [item for item in self.items if item is not None]
+        self.slots = {id(item): i for i, item in enumerate(self.items)}
+
+    # Pickling keeps the entities, not their ids, which mean nothing in
+    # another process; the id-keyed slots are rebuilt on load
+    def __getstate__(self):
+        return [item for item in self.items if item is not None]
+
+    def __setstate__(self, items):
+        self.__init__(items)
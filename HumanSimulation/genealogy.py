@@ -0,0 +1,104 @@
+from array import array
+
+# Parent id of the founders, who were spawned rather than born
+NO_PARENT = -1
+# Death tick of anyone still alive
+ALIVE = -1
+
+
+# Genealogy Class
+# Family tree of every human who ever lived, as parallel int arrays indexed by
+# human id. Ids are handed out in order of birth, so parents always have
+# smaller ids than their children. A record is a few dozen bytes and holds no
+# reference to the Human, so the dead are kept as numbers only.
+class Genealogy:
+    def __init__(self):
+        self.mother = array('i')
+        self.father = array('i')
+        # Id of the founder at the root of the maternal line
+        self.lineage = array('i')
+        self.generation = array('i')
+        self.born = array('i')
+        self.died = array('i')
+
+    def __len__(self):
+        return len(self.born)
+
+    def add(self, generation, tick, mother=NO_PARENT, father=NO_PARENT):
+        # Record a new individual and return its id
+        person = len(self.born)
+        self.mother.append(mother)
+        self.father.append(father)
+        self.lineage.append(person if mother == NO_PARENT else self.lineage[mother])
+        self.generation.append(generation)
+        self.born.append(tick)
+        self.died.append(ALIVE)
+        return person
+
+    def record_death(self, person, tick):
+        self.died[person] = tick
+
+    def is_alive(self, person):
+        return self.died[person] == ALIVE
+
+    def parents(self, person):
+        return tuple(parent for parent in (self.mother[person], self.father[person]) if parent != NO_PARENT)
+
+    def children(self, person):
+        # Every id after the person's own is a candidate; nothing earlier can be
+        mother, father = self.mother, self.father
+        return [child for child in range(person + 1, len(self)) if mother[child] == person or father[child] == person]
+
+    def ancestors(self, person):
+        # One backward pass from the person towards the founders, marking the
+        # parents of everyone marked; newest ancestors come first. The spare
+        # last slot of marked absorbs NO_PARENT (-1) and is never visited.
+        marked = bytearray(len(self) + 1)
+        marked[person] = 1
+        mother, father = self.mother, self.father
+        found = []
+        for ancestor in range(person, -1, -1):
+            if marked[ancestor]:
+                if ancestor != person:
+                    found.append(ancestor)
+                marked[mother[ancestor]] = 1
+                marked[father[ancestor]] = 1
+        return found
+
+    def descendants(self, person):
+        # One forward pass in birth order: a child descends from the person if
+        # either parent does. marked has a spare last slot that stays 0, so
+        # NO_PARENT (-1) indexes it and never matches.
+        marked = bytearray(len(self) + 1)
+        marked[person] = 1
+        mother, father = self.mother, self.father
+        found = []
+        for child in range(person + 1, len(self)):
+            if marked[mother[child]] or marked[father[child]]:
+                marked[child] = 1
+                found.append(child)
+        return found
+
+    def lineage_stats(self):
+        # Survival of every maternal line, keyed by founder id: individuals
+        # ever born, still alive, deepest generation, mean lifespan of the
+        # dead in ticks, and the tick the line died out (None while alive)
+        stats = {}
+        for lineage, generation, born, died in zip(self.lineage, self.generation, self.born, self.died):
+            line = stats.get(lineage)
+            if line is None:
+                line = stats[lineage] = {'born': 0, 'alive': 0, 'max_generation': 0, 'lifespan': 0, 'extinct_tick': 0}
+            line['born'] += 1
+            line['max_generation'] = max(line['max_generation'], generation)
+            if died == ALIVE:
+                line['alive'] += 1
+            else:
+                line['lifespan'] += died - born
+                line['extinct_tick'] = max(line['extinct_tick'], died)
+
+        for line in stats.values():
+            dead = line['born'] - line['alive']
+            line['mean_lifespan'] = line.pop('lifespan') / dead if dead else None
+            if line['alive']:
+                line['extinct_tick'] = None
+        return stats
@@ -0,0 +1,108 @@
+import sys
+import time
+from collections import defaultdict
+
+
+def simulation_targets(world_class=None):
+    # (owner, attribute, label) for the phases of World.step and each branch
+    # of Human.move. Classes are looked up next to world_class so that
+    # running simulation.py as __main__ instruments the right module.
+    from entities import EntityStore
+    from proximity import Contacts
+
+    if world_class is None:
+        from simulation import World as world_class
+    module = sys.modules[world_class.__module__]
+    World, Human, Animal = world_class, module.Human, module.Animal
+
+    return [
+        (World, 'step', 'step'),
+        (Human, 'update_stats', 'stats'),
+        (World, 'wake_due', 'wake'),
+        (Human, 'seek_water', 'seek_water'),
+        (Human, 'seek_food', 'seek_food'),
+        (World, 'batch_nearest', 'batch_nearest'),
+        (World, 'assign_food', 'assign_food'),
+        (World, 'resolve_contacts', 'contacts'),
+        (Contacts, 'detect', 'detect'),
+        (Human, 'breed', 'breed'),
+        (Human, 'random_movement', 'roam'),
+        (Animal, 'move', 'animals'),
+        (EntityStore, 'compact', 'cleanup'),
+        (World, 'rebalance_grids', 'grids'),
+    ]
+
+
+# Profiler Class
+# Timers and call counters around named phases. Enabling swaps each target
+# attribute for a timing wrapper and disabling puts the original back, so a
+# disabled profiler leaves no code at all in the hot path. The wrappers are
+# installed on the classes, so they time every world in the process.
+class Profiler:
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.originals = []
+
+    @property
+    def enabled(self):
+        return bool(self.originals)
+
+    def enable(self, targets=None):
+        if targets is None:
+            targets = simulation_targets()
+        for owner, name, label in targets:
+            original = getattr(owner, name)
+            self.originals.append((owner, name, original))
+            setattr(owner, name, self._timed(original, label))
+
+    def disable(self):
+        for owner, name, original in reversed(self.originals):
+            setattr(owner, name, original)
+        self.originals = []
+
+    def _timed(self, original, label):
+        seconds = self.seconds
+        calls = self.calls
+        clock = time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                seconds[label] += clock() - start
+                calls[label] += 1
+        return wrapper
+
+    def reset(self, world=None):
+        self.seconds.clear()
+        self.calls.clear()
+        if world is not None:
+            for grid in world.grids().values():
+                grid.queries = 0
+                grid.scanned = 0
+
+    def summary(self, world=None, frames=None):
+        # Lines of per-phase time per tick plus nearest-query counts, covering
+        # everything since the last reset. Drawing is timed per frame instead:
+        # a profiler around the viewer passes the frames drawn since then.
+        if frames is None:
+            count, unit = self.calls.get('step', 0), 'tick'
+        else:
+            count, unit = frames, 'frame'
+        lines = [f"{count} {unit}s"]
+        count = count or 1
+        for label, seconds in sorted(self.seconds.items(), key=lambda item: -item[1]):
+            lines.append(f"{label:<14}{seconds / count * 1000:>9.3f} ms/{unit} {self.calls[label] / count:>9.1f} calls/{unit}")
+        if world is not None:
+            for name, grid in world.grids().items():
+                if grid.queries:
+                    lines.append(f"{name + ' grid':<14}{grid.queries / count:>9.2f} queries/tick "
+                                 f"{grid.scanned / grid.queries:>6.1f} scanned/query")
+        return lines
+
+    def dump(self, world=None, out=None):
+        # Print a summary and start a new measuring window
+        print("\n".join(self.summary(world)), file=out, flush=True)
+        self.reset(world)
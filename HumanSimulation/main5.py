@@ -0,0 +1,457 @@
+import time
+from collections import OrderedDict
+
+import pygame
+
+from instrument import Profiler, simulation_targets
+from pipeline import SimulationThread, DETAIL_MODES, TICKS_PER_SECOND, interpolate
+from simulation import World, WIDTH, HEIGHT, MALE, PUDDLE_WIDTH, PUDDLE_HEIGHT
+
+# Window size; the world can be any size and is seen through a Camera
+WINDOW_WIDTH, WINDOW_HEIGHT = WIDTH, HEIGHT
+
+# Camera controls: arrow keys pan, the mouse wheel zooms around the cursor,
+# Home shows the whole world again
+PAN_SPEED = 12  # window pixels per frame
+ZOOM_STEP = 1.25
+MAX_ZOOM = 4
+# Window pixels around the view still searched for things to draw, so
+# sprites and labels of entities just outside it are not cut off
+VIEW_MARGIN = 200
+
+# Frames drawn per wall-clock second, whatever the tick rate
+FRAMES_PER_SECOND = 60
+
+# Most rendered labels kept around by the text cache
+TEXT_CACHE_SIZE = 4096
+
+# Level of detail for humans is cycled with the L key, see pipeline.py
+HEATMAP_CELL = 20  # pixels per heatmap cell
+
+# Past this many changed rects a full flip is cheaper than a partial update
+DIRTY_RECT_LIMIT = 400
+
+# Frames between profiler dumps to stdout and overlay refreshes (P toggles)
+PROFILE_INTERVAL = 300
+
+# Colors
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+RED = (255, 0, 0)
+GREEN = (0, 255, 0)
+LIGHT_BLUE = (173, 216, 230)
+DARK_BLUE = (0, 0, 139)
+GRAY = (128, 128, 128)
+BLUE = (0, 0, 255)
+PINK = (255, 192, 203)
+
+
+# TextCache Class
+# Bounded LRU of rendered label surfaces keyed by (text, colour). Stat values
+# only change every few seconds, so most labels are blitted straight from
+# the cache instead of being rasterized again every frame.
+class TextCache:
+    def __init__(self, font, max_size=TEXT_CACHE_SIZE):
+        self.font = font
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+
+    def render(self, text, color):
+        key = (text, color)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = self.font.render(text, True, color)
+            self.surfaces[key] = surface
+            if len(self.surfaces) > self.max_size:
+                self.surfaces.popitem(last=False)
+        else:
+            self.surfaces.move_to_end(key)
+        return surface
+
+
+# Camera Class
+# The part of the world shown in the window: the world point at the window's
+# top-left corner and the zoom, in window pixels per world pixel. The view is
+# kept over the world, centred on it along any side the world does not fill.
+class Camera:
+    def __init__(self, world_width, world_height, width=WINDOW_WIDTH, height=WINDOW_HEIGHT):
+        self.world_width = world_width
+        self.world_height = world_height
+        self.width = width
+        self.height = height
+        self.reset()
+
+    def reset(self):
+        # Fit the whole world, but never blow a small one up past 1:1
+        self.zoom = min(1, self.min_zoom())
+        self.x = self.y = 0
+        self.clamp()
+
+    def min_zoom(self):
+        return min(self.width / self.world_width, self.height / self.world_height)
+
+    def state(self):
+        return self.x, self.y, self.zoom
+
+    def clamp(self):
+        view_width = self.width / self.zoom
+        view_height = self.height / self.zoom
+        if view_width >= self.world_width:
+            self.x = (self.world_width - view_width) / 2
+        else:
+            self.x = max(0, min(self.world_width - view_width, self.x))
+        if view_height >= self.world_height:
+            self.y = (self.world_height - view_height) / 2
+        else:
+            self.y = max(0, min(self.world_height - view_height, self.y))
+
+    def pan(self, dx, dy):
+        # dx, dy in window pixels
+        self.x += dx / self.zoom
+        self.y += dy / self.zoom
+        self.clamp()
+
+    def zoom_at(self, factor, sx, sy):
+        # Zoom keeping the world point under window pixel (sx, sy) in place
+        x, y = self.to_world(sx, sy)
+        self.zoom = max(min(1, self.min_zoom()), min(MAX_ZOOM, self.zoom * factor))
+        self.x = x - sx / self.zoom
+        self.y = y - sy / self.zoom
+        self.clamp()
+
+    def to_screen(self, x, y):
+        zoom = self.zoom
+        return int((x - self.x) * zoom), int((y - self.y) * zoom)
+
+    def to_world(self, sx, sy):
+        return self.x + sx / self.zoom, self.y + sy / self.zoom
+
+    def scale(self, length):
+        # A world length in window pixels, never thinner than one pixel
+        return max(1, int(length * self.zoom))
+
+    def view(self, margin=0):
+        # (left, top, right, bottom) of the world area in the window, grown
+        # by margin window pixels on every side
+        pad = margin / self.zoom
+        return (self.x - pad, self.y - pad,
+                self.x + self.width / self.zoom + pad, self.y + self.height / self.zoom + pad)
+
+
+# Viewer Class
+# Optional pygame window on top of a headless World. The World never calls
+# into the viewer, so batch runs can skip it entirely. The world runs in a
+# pipeline.SimulationThread and the viewer only draws the frames it
+# publishes, moving everyone smoothly from one tick to the next in between.
+class Viewer:
+    def __init__(self, world):
+        self.world = world
+        self.simulation = SimulationThread(world)
+        self.camera = Camera(world.width, world.height)
+        self.fast_forward = False
+        self.detail_mode = 'auto'
+        # Two profilers, so each is only ever touched by one thread: one for
+        # the world, read and reset on the simulation thread, and one for
+        # drawing, timed per frame on this one
+        self.profiler = Profiler()
+        self.draw_profiler = Profiler()
+        self.profile_lines = []
+        self.profile_frames = 0
+
+        # Initialize Pygame
+        pygame.init()
+
+        # Set up display
+        self.window = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+        pygame.display.set_caption("Human Simulation")
+
+        # Fonts
+        self.font = pygame.font.SysFont(None, 24)
+        self.text = TextCache(self.font)
+
+        # Load the background image; it covers each WIDTH x HEIGHT patch of
+        # the world and is scaled again whenever the zoom changes
+        self.background_image = pygame.image.load('dessert_blank.png').convert()
+        self.background_tile = None
+        self.background_zoom = None
+
+        # Background, puddles and plants in view pre-drawn on one surface,
+        # rebuilt only when a frame brings new statics or the camera moves
+        self.static_layer = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT)).convert()
+        self.statics = None
+        self.static_camera = None
+        # Screen areas drawn over the static layer last frame and this frame
+        self.dirty_rects = []
+        self.drawn = []
+
+    def draw_background(self, layer):
+        # Tile the background over the part of the world in view, and leave
+        # whatever lies beyond the world's edges gray
+        camera = self.camera
+        if self.background_zoom != camera.zoom:
+            # One pixel over, so rounding never leaves a seam between tiles
+            size = (camera.scale(WIDTH) + 1, camera.scale(HEIGHT) + 1)
+            self.background_tile = pygame.transform.scale(self.background_image, size)
+            self.background_zoom = camera.zoom
+        tile = self.background_tile
+
+        layer.fill(GRAY)
+        left, top, right, bottom = camera.view()
+        world = self.world
+        for col in range(max(0, int(left // WIDTH)), int(min(right, world.width - 1) // WIDTH) + 1):
+            for row in range(max(0, int(top // HEIGHT)), int(min(bottom, world.height - 1) // HEIGHT) + 1):
+                x, y = camera.to_screen(col * WIDTH, row * HEIGHT)
+                # Crop tiles at the world's right and bottom edges
+                area = (0, 0, camera.scale(min(WIDTH, world.width - col * WIDTH)) + 1,
+                        camera.scale(min(HEIGHT, world.height - row * HEIGHT)) + 1)
+                layer.blit(tile, (x, y), area)
+
+    def draw_static_layer(self, statics):
+        layer = self.static_layer
+        camera = self.camera
+        puddles, plants = statics
+
+        # Draw the background image
+        self.draw_background(layer)
+
+        # Draw puddles
+        width, height = camera.scale(PUDDLE_WIDTH), camera.scale(PUDDLE_HEIGHT)
+        for position in puddles:
+            x, y = camera.to_screen(*position)
+            pygame.draw.ellipse(layer, LIGHT_BLUE, (x - width // 2, y - height // 2, width, height))
+            pygame.draw.ellipse(layer, DARK_BLUE, (x - width // 2, y - height // 2, width, height), 2)  # Larger puddles
+
+        # Draw plants
+        radius = camera.scale(10)
+        for position in plants:
+            pygame.draw.circle(layer, GREEN, camera.to_screen(*position), radius)  # Larger plants
+
+        self.statics = statics
+        self.static_camera = camera.state()
+
+    def draw(self, now=None):
+        # Draw the latest frame from the simulation thread, or the way from
+        # the one before to it that the time since it came in covers
+        previous, frame = self.simulation.latest()
+        if frame is None:
+            return
+        if now is None:
+            now = time.perf_counter()
+        alpha = min(1, (now - frame.time) * TICKS_PER_SECOND)
+
+        # Restore the static layer, in full if it changed or only under last
+        # frame's sprites otherwise
+        camera = self.camera
+        full_redraw = self.statics is not frame.statics or self.static_camera != camera.state()
+        if full_redraw:
+            self.draw_static_layer(frame.statics)
+            self.window.blit(self.static_layer, (0, 0))
+        else:
+            for rect in self.dirty_rects:
+                self.window.blit(self.static_layer, rect, rect)
+
+        self.drawn = []
+        drawn = self.drawn
+
+        # The frame only holds what is in the chunks around the view
+        humans = frame.humans
+        positions = interpolate(previous and previous.humans, humans, alpha)
+
+        # Draw humans at the frame's level of detail
+        mode = frame.mode
+        if mode == 'full':
+            for human, position in zip(humans, positions):
+                self.draw_human(human, *camera.to_screen(*position))
+        elif mode == 'dots':
+            for human, position in zip(humans, positions):
+                color = BLUE if human[3] == MALE else PINK
+                drawn.append(pygame.draw.circle(self.window, color, camera.to_screen(*position), 3))
+        else:
+            self.draw_heatmap(positions)
+
+        # Draw animals
+        radius = camera.scale(5)
+        for position in interpolate(previous and previous.animals, frame.animals, alpha):
+            drawn.append(pygame.draw.circle(self.window, RED, camera.to_screen(*position), radius))  # Moving red dots
+
+        mode_text = self.text.render(f"Detail: {self.detail_mode} ({mode})", BLACK)
+        drawn.append(self.window.blit(mode_text, (10, 10)))
+
+        # Profiler overlay, refreshed every PROFILE_INTERVAL frames
+        for i, line in enumerate(self.profile_lines):
+            line_text = self.text.render(line, BLACK)
+            drawn.append(self.window.blit(line_text, (10, 30 + i * 18)))
+
+        # Only push the changed areas to the screen when there are few enough
+        changed = self.dirty_rects + drawn
+        if full_redraw or len(changed) > DIRTY_RECT_LIMIT:
+            pygame.display.flip()
+        else:
+            pygame.display.update(changed)
+        self.dirty_rects = drawn
+
+    def draw_heatmap(self, positions):
+        # Count humans per cell on a small surface, then scale it up over the
+        # window, so the cost depends on the grid size rather than the crowd.
+        # Cells are window pixels, so the map stays as fine at any zoom.
+        cols = WINDOW_WIDTH // HEATMAP_CELL + 1
+        rows = WINDOW_HEIGHT // HEATMAP_CELL + 1
+        to_screen = self.camera.to_screen
+        counts = {}
+        for position in positions:
+            x, y = to_screen(*position)
+            cell = (x // HEATMAP_CELL, y // HEATMAP_CELL)
+            if 0 <= cell[0] < cols and 0 <= cell[1] < rows:
+                counts[cell] = counts.get(cell, 0) + 1
+        if not counts:
+            return
+
+        heat = pygame.Surface((cols, rows), pygame.SRCALPHA)
+        peak = max(counts.values())
+        for cell, count in counts.items():
+            level = count / peak
+            heat.set_at(cell, (255, int(255 * (1 - level)), 0, 80 + int(150 * level)))
+        heat = pygame.transform.scale(heat, (cols * HEATMAP_CELL, rows * HEATMAP_CELL))
+        self.drawn.append(self.window.blit(heat, (0, 0)))
+
+    def draw_human(self, human, x, y):
+        # human is a Frame row, drawn at window pixel (x, y)
+        _, _, _, gender, stats = human
+        camera = self.camera
+        center = (x, y)
+        self.drawn.append(pygame.draw.circle(self.window, BLACK, center, camera.scale(10)))
+        if gender == MALE:
+            pygame.draw.circle(self.window, BLUE, center, camera.scale(5))
+        else:
+            pygame.draw.circle(self.window, PINK, center, camera.scale(5))
+        self.draw_stats(stats, x, y)
+
+    def draw_stats(self, stats, x, y):
+        # Labels stay the same size at any zoom, stacked above (x, y) in the window
+        text = self.text
+        surface = self.window
+        drawn = self.drawn
+        water, hunger, energy, age, death_age, generation, sleeping = stats
+        water_text = text.render(f"Water: {int(water)}", RED)
+        hunger_text = text.render(f"Hunger: {int(hunger)}", RED)
+        energy_text = text.render(f"Energy: {int(energy)}", RED)
+        age_text = text.render(f"Age: {age}", RED)
+        death_age_text = text.render(f"Death Age: {death_age}", RED)
+        generation_text = text.render(f"Gen: {generation}", RED)
+
+        text_y_offset = 20
+        total_text_height = 8 * text_y_offset
+        start_y = y - 30 - total_text_height
+
+        drawn.append(surface.blit(water_text, (x - water_text.get_width() // 2, start_y)))
+        drawn.append(surface.blit(hunger_text, (x - hunger_text.get_width() // 2, start_y + text_y_offset)))
+        drawn.append(surface.blit(energy_text, (x - energy_text.get_width() // 2, start_y + 2 * text_y_offset)))
+        drawn.append(surface.blit(age_text, (x - age_text.get_width() // 2, start_y + 3 * text_y_offset)))
+        drawn.append(surface.blit(death_age_text, (x - death_age_text.get_width() // 2, start_y + 4 * text_y_offset)))
+        drawn.append(surface.blit(generation_text, (x - generation_text.get_width() // 2, start_y + 5 * text_y_offset)))
+
+        if sleeping:
+            sleep_text = text.render("Sleeping", GRAY)
+            drawn.append(surface.blit(sleep_text, (x - sleep_text.get_width() // 2, start_y + 6 * text_y_offset)))
+
+    def draw_targets(self):
+        return [
+            (Viewer, 'draw', 'draw'),
+            (Viewer, 'draw_static_layer', 'static_layer'),
+            (Viewer, 'draw_stats', 'draw_stats'),
+            (pygame.display, 'flip', 'display_flip'),
+            (pygame.display, 'update', 'display_update'),
+        ]
+
+    def toggle_profiler(self):
+        if self.profiler.enabled:
+            self.profiler.disable()
+            self.draw_profiler.disable()
+            self.profile_lines = []
+        else:
+            self.simulation.call(self.profiler.reset)
+            self.profiler.enable(simulation_targets(type(self.world)))
+            self.draw_profiler.reset()
+            self.draw_profiler.enable(self.draw_targets())
+            self.profile_lines = ["Profiling..."]
+            self.profile_frames = 0
+
+    def update_profile(self):
+        self.profile_frames += 1
+        if self.profile_frames >= PROFILE_INTERVAL:
+            draw_lines = self.draw_profiler.summary(frames=self.profile_frames)
+            self.draw_profiler.reset()
+            self.profile_frames = 0
+            self.simulation.call(lambda world: self.report_profile(world, draw_lines))
+
+    def report_profile(self, world, draw_lines):
+        # On the simulation thread: both summaries in the overlay and on
+        # stdout, then a new measuring window for the world's phases
+        if not self.profiler.enabled:
+            return
+        lines = self.profiler.summary(world) + draw_lines
+        print("\n".join(lines), flush=True)
+        self.profiler.reset(world)
+        self.profile_lines = lines
+
+    def run(self):
+        # Main loop: the simulation thread steps the world, this one only
+        # handles input and draws
+        running = True
+        clock = pygame.time.Clock()
+        simulation = self.simulation
+        simulation.request = (self.camera.view(VIEW_MARGIN), self.detail_mode)
+        simulation.start()
+
+        while running:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+                elif event.type == pygame.KEYDOWN and event.key == pygame.K_f:
+                    # Toggle fast-forward
+                    self.fast_forward = not self.fast_forward
+                elif event.type == pygame.KEYDOWN and event.key == pygame.K_p:
+                    # Toggle the profiler
+                    self.toggle_profiler()
+                elif event.type == pygame.KEYDOWN and event.key == pygame.K_l:
+                    # Cycle the level of detail
+                    next_mode = DETAIL_MODES.index(self.detail_mode) + 1
+                    self.detail_mode = DETAIL_MODES[next_mode % len(DETAIL_MODES)]
+                elif event.type == pygame.KEYDOWN and event.key == pygame.K_HOME:
+                    # Show the whole world
+                    self.camera.reset()
+                elif event.type == pygame.MOUSEWHEEL:
+                    # Zoom around the cursor
+                    self.camera.zoom_at(ZOOM_STEP ** event.y, *pygame.mouse.get_pos())
+
+            # Pan while the arrow keys are held
+            keys = pygame.key.get_pressed()
+            pan_x = keys[pygame.K_RIGHT] - keys[pygame.K_LEFT]
+            pan_y = keys[pygame.K_DOWN] - keys[pygame.K_UP]
+            if pan_x or pan_y:
+                self.camera.pan(pan_x * PAN_SPEED, pan_y * PAN_SPEED)
+
+            # What the next frames should hold
+            simulation.fast_forward = self.fast_forward
+            simulation.request = (self.camera.view(VIEW_MARGIN), self.detail_mode)
+
+            self.draw()
+            if self.profiler.enabled:
+                self.update_profile()
+
+            # Control the frame rate; the tick rate is the simulation's own
+            clock.tick(FRAMES_PER_SECOND)
+
+        simulation.stop()
+        self.profiler.disable()
+        self.draw_profiler.disable()
+        pygame.quit()
+
+
+# python main5.py [seed] [width height]
+if __name__ == "__main__":
+    import sys
+
+    seed = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    width, height = (int(sys.argv[2]), int(sys.argv[3])) if len(sys.argv) > 3 else (WIDTH, HEIGHT)
+    Viewer(World(seed=seed, width=width, height=height)).run()
@@ -0,0 +1,168 @@
+import threading
+import time
+from collections import deque
+
+from simulation import TICKS_PER_SECOND
+
+# Level of detail for humans. In 'auto' the mode is picked from the
+# population in view: full overlays up to FULL_DETAIL_LIMIT humans, gender
+# dots up to DOTS_LIMIT, a density heatmap beyond that.
+DETAIL_MODES = ('auto', 'full', 'dots', 'heatmap')
+FULL_DETAIL_LIMIT = 50
+DOTS_LIMIT = 2000
+
+TICK_SECONDS = 1 / TICKS_PER_SECOND
+
+
+def detail_level(mode, population):
+    if mode != 'auto':
+        return mode
+    if population <= FULL_DETAIL_LIMIT:
+        return 'full'
+    if population <= DOTS_LIMIT:
+        return 'dots'
+    return 'heatmap'
+
+
+# Frame Class
+# What a viewer needs to draw one tick, copied out of the world by the
+# simulation thread and never changed afterwards, so the viewer can read it
+# while the world moves on. Only what lies in the requested view is copied.
+#   humans:  (id, x, y, gender, stats) rows; stats is None unless the mode
+#            is 'full', else (water, hunger, energy, age, death_age,
+#            generation, sleeping)
+#   animals: (animal, x, y) rows; the animal is only a key for matching
+#            rows between frames and must not be read
+#   statics: (puddles, plants) as (x, y) lists, the same object from frame
+#            to frame while neither they nor the view change
+class Frame:
+    __slots__ = ('tick', 'time', 'view', 'mode', 'humans', 'animals', 'statics')
+
+    def __init__(self, world, view, detail_mode, statics):
+        chunks = world.chunks
+        humans = chunks.in_view(chunks.humans, *view)
+        self.tick = world.tick
+        self.time = time.perf_counter()
+        self.view = view
+        self.mode = detail_level(detail_mode, len(humans))
+        if self.mode == 'full':
+            current_stats = world.current_stats
+            self.humans = [(human.id, human.x, human.y, human.gender,
+                            (*current_stats(human), human.death_age, human.generation, human.sleeping))
+                           for human in humans]
+        else:
+            self.humans = [(human.id, human.x, human.y, human.gender, None) for human in humans]
+        self.animals = [(animal, animal.x, animal.y) for animal in chunks.in_view(chunks.animals, *view)]
+        self.statics = statics
+
+
+def interpolate(previous, rows, alpha):
+    # (x, y) of every row, alpha of the way from where the row with the same
+    # key stood in previous; rows new since then stay where they are
+    if previous is None or alpha >= 1:
+        return [(row[1], row[2]) for row in rows]
+    before = {row[0]: row for row in previous}
+    positions = []
+    for row in rows:
+        x, y = row[1], row[2]
+        old = before.get(row[0])
+        if old is not None:
+            x = old[1] + (x - old[1]) * alpha
+            y = old[2] + (y - old[2]) * alpha
+        positions.append((x, y))
+    return positions
+
+
+# SimulationThread Class
+# Steps a World in the background, TICKS_PER_SECOND ticks per wall-clock
+# second or as fast as it can in fast-forward, and publishes a Frame after
+# every tick. The last two frames are swapped in as one tuple, so a viewer
+# always gets a consistent (previous, latest) pair without taking a lock and
+# draws at its own frame rate; a slow frame never holds the simulation up.
+# Nothing but this thread may touch the world while it runs; call hands it
+# anything else that needs to, to run between two ticks.
+class SimulationThread:
+    def __init__(self, world, view=(0, 0, 0, 0), detail_mode='auto'):
+        self.world = world
+        self.fast_forward = False
+        # Set by the viewer: what to copy into the next frame
+        self.request = (view, detail_mode)
+        self.frames = (None, None)
+        # Whether the viewer has taken the latest frame; in fast-forward the
+        # simulation only stops to publish another one once it has
+        self.taken = True
+        self.error = None
+        self.running = False
+        self.thread = None
+        self.statics = None
+        self.statics_key = None
+        # Functions of the world to run between two ticks, see call
+        self.calls = deque()
+
+    def start(self):
+        self.publish()
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="simulation", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def call(self, function):
+        # Run function(world) on the simulation thread after the next tick,
+        # for anything that must not touch the world while it is stepping
+        self.calls.append(function)
+
+    def run_calls(self):
+        while self.calls:
+            self.calls.popleft()(self.world)
+
+    def latest(self):
+        # (previous, latest) frames; previous is None when there is no tick
+        # right before latest to interpolate from
+        self.taken = True
+        if self.error is not None:
+            raise RuntimeError("simulation thread failed") from self.error
+        return self.frames
+
+    def publish(self):
+        world = self.world
+        view, detail_mode = self.request
+        key = (world.static_version, view)
+        if key != self.statics_key:
+            # Puddles and plants only change with static_version
+            chunks = world.chunks
+            self.statics = ([world.puddles.position(puddle) for puddle in chunks.in_view(chunks.puddles, *view)],
+                            [world.plants.position(plant) for plant in chunks.in_view(chunks.plants, *view)])
+            self.statics_key = key
+        frame = Frame(world, view, detail_mode, self.statics)
+        latest = self.frames[1]
+        self.frames = (latest if latest is not None and latest.tick == frame.tick - 1 else None, frame)
+        self.taken = False
+
+    def run(self):
+        world = self.world
+        clock = time.perf_counter
+        next_tick = clock()
+        try:
+            while self.running:
+                if self.fast_forward:
+                    world.step()
+                    self.run_calls()
+                    if self.taken:
+                        self.publish()
+                    next_tick = clock()
+                    continue
+                delay = next_tick - clock()
+                if delay > 0:
+                    time.sleep(delay)
+                world.step()
+                self.run_calls()
+                self.publish()
+                # Fall behind rather than rush through missed ticks
+                next_tick = max(next_tick + TICK_SECONDS, clock() - TICK_SECONDS)
+        except Exception as error:
+            self.error = error
@@ -0,0 +1,56 @@
+from spatial import object_position
+
+# Contact ranges: a human drinks within DRINK_RANGE of its puddle and eats or
+# breeds within REACH of its target. Every test compares squared distances
+# with the squared ranges, so none of them takes a square root.
+DRINK_RANGE = 20
+REACH = 10
+DRINK_RANGE2 = DRINK_RANGE * DRINK_RANGE
+REACH2 = REACH * REACH
+
+# What a contact is with
+PUDDLE_CONTACT, ANIMAL_CONTACT, PLANT_CONTACT, MATE_CONTACT = range(4)
+
+
+def distance2(ax, ay, bx, by):
+    dx = ax - bx
+    dy = ay - by
+    return dx * dx + dy * dy
+
+
+# Contacts Class
+# Targets the humans went for this tick, registered by the behaviour code as
+# it steers and tested together in one pass once everybody has moved. Each
+# human only registers the target it picked out of a SpatialGrid, so the
+# grid's cell search is the broad phase and detect() only does the narrow one.
+class Contacts:
+    def __init__(self, puddle_position, plant_position):
+        self.pending = []
+        # Target position getter and squared range, by contact kind
+        self.position = (puddle_position, object_position, plant_position, object_position)
+        self.range2 = (DRINK_RANGE2, REACH2, REACH2, REACH2)
+
+    def __len__(self):
+        return len(self.pending)
+
+    def add(self, human, kind, target):
+        # The human is tested where it stands now, right after the move that
+        # aimed at the target; the target where it is when detect() runs
+        self.pending.append((human, kind, target, human.x, human.y))
+
+    def detect(self):
+        # Take this tick's registrations and return the contacts in range, as
+        # (human, kind, target) in the order they were registered, and every
+        # human that registered anything, once each
+        pending = self.pending
+        self.pending = []
+        position = self.position
+        range2 = self.range2
+        found = []
+        for human, kind, target, x, y in pending:
+            tx, ty = position[kind](target)
+            dx = x - tx
+            dy = y - ty
+            if dx * dx + dy * dy < range2[kind]:
+                found.append((human, kind, target))
+        return found, list(dict.fromkeys(registration[0] for registration in pending))
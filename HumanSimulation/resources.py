@@ -0,0 +1,172 @@
+import math
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # batching is only a shortcut; the grids answer on their own
+    np = None
+
+# Resources per cell of the grid nearest_cells sorts them into, and queries
+# worked on at once, which bounds the candidate pairs held in memory
+TARGETS_PER_CELL = 2
+QUERY_CHUNK = 16384
+
+# A handle is a slot index with the slot's generation in the bits above it,
+# so a handle kept past its resource's removal never matches the next
+# resource to reuse that slot
+SLOT_BITS = 32
+SLOT_MASK = (1 << SLOT_BITS) - 1
+
+
+# ResourcePool Class
+# Static resources (plants, puddles) as parallel typed columns instead of one
+# tuple per resource. Removed slots go on a free list and are filled again by
+# the next add, so the columns stay as long as the peak count rather than
+# growing with every respawn. Positions are plain doubles, so NumPy can view
+# the columns without copying (see World.batch_nearest).
+class ResourcePool:
+    def __init__(self, positions=()):
+        self.x = array('d')
+        self.y = array('d')
+        self.generation = array('I')
+        self.live = bytearray()
+        self.free = []
+        self.count = 0
+        for x, y in positions:
+            self.add(x, y)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        # Handles of live resources in slot order
+        generation = self.generation
+        for slot, live in enumerate(self.live):
+            if live:
+                yield slot | generation[slot] << SLOT_BITS
+
+    def add(self, x, y):
+        if self.free:
+            slot = self.free.pop()
+            self.x[slot] = x
+            self.y[slot] = y
+            self.live[slot] = 1
+        else:
+            slot = len(self.live)
+            self.x.append(x)
+            self.y.append(y)
+            self.generation.append(0)
+            self.live.append(1)
+        self.count += 1
+        return slot | self.generation[slot] << SLOT_BITS
+
+    def remove(self, handle):
+        slot = handle & SLOT_MASK
+        self.live[slot] = 0
+        self.generation[slot] += 1
+        self.free.append(slot)
+        self.count -= 1
+
+    def position(self, handle):
+        slot = handle & SLOT_MASK
+        return self.x[slot], self.y[slot]
+
+    def nearest_many(self, queries):
+        # Handle of the nearest live resource to each object in queries, all
+        # found in a few vectorized passes (see nearest_cells). None where two
+        # resources tie for nearest, and everywhere when NumPy is missing;
+        # the caller asks its grid for those, which breaks ties its own way.
+        if np is None or not self.count or not queries:
+            return [None] * len(queries)
+        slots = np.flatnonzero(np.frombuffer(self.live, dtype=np.uint8))
+        tx = np.frombuffer(self.x)[slots]
+        ty = np.frombuffer(self.y)[slots]
+        qx = np.fromiter((query.x for query in queries), dtype=float, count=len(queries))
+        qy = np.fromiter((query.y for query in queries), dtype=float, count=len(queries))
+        best, unique = nearest_cells(qx, qy, tx, ty)
+
+        generation = self.generation
+        return [
+            slot | generation[slot] << SLOT_BITS if ok else None
+            for slot, ok in zip(slots[best].tolist(), unique.tolist())
+        ]
+
+
+def ring_offsets(r):
+    # (dx, dy) of the cells at Chebyshev distance r from a cell
+    if r == 0:
+        return np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.int64)
+    side = np.arange(-r, r + 1)
+    inner = np.arange(-r + 1, r)
+    dx = np.concatenate((side, side, np.full(len(inner), -r), np.full(len(inner), r)))
+    dy = np.concatenate((np.full(len(side), -r), np.full(len(side), r), inner, inner))
+    return dx, dy
+
+
+def nearest_cells(qx, qy, tx, ty):
+    # (index of the nearest target, whether no other target is as near) for
+    # every query point. The targets are sorted by the cell of a uniform grid
+    # holding about TARGETS_PER_CELL each, and every query looks at rings of
+    # cells around its own, as SpatialGrid.nearest does, until nothing in
+    # the next ring could be as near as its best. So the answer is exact,
+    # and each query only measures the few targets around it however many
+    # there are.
+    left = min(tx.min(), qx.min())
+    top = min(ty.min(), qy.min())
+    width = max(tx.max(), qx.max()) - left
+    height = max(ty.max(), qy.max()) - top
+    cell = max(math.sqrt(max(width * height, 1.0) * TARGETS_PER_CELL / len(tx)), 1.0)
+    cols = int(width // cell) + 1
+    rows = int(height // cell) + 1
+
+    # Targets in cell order, and where each cell's run of them starts
+    keys = ((ty - top) // cell).astype(np.int64) * cols + ((tx - left) // cell).astype(np.int64)
+    order = np.argsort(keys, kind='stable')
+    starts = np.zeros(cols * rows + 1, dtype=np.intp)
+    np.cumsum(np.bincount(keys, minlength=cols * rows), out=starts[1:])
+
+    best = np.empty(len(qx), dtype=np.intp)
+    unique = np.empty(len(qx), dtype=bool)
+    for start in range(0, len(qx), QUERY_CHUNK):
+        cx = ((qx[start:start + QUERY_CHUNK] - left) // cell).astype(np.int64)
+        cy = ((qy[start:start + QUERY_CHUNK] - top) // cell).astype(np.int64)
+        n = len(cx)
+        best_d2 = np.full(n, np.inf)
+        found = np.full(n, -1, dtype=np.intp)
+        ties = np.zeros(n, dtype=np.intp)
+        pending = np.arange(n)
+        r = 0
+        while len(pending):
+            # Every (query, target) pair in ring r around the pending queries
+            dx, dy = ring_offsets(r)
+            gx = cx[pending, None] + dx
+            gy = cy[pending, None] + dy
+            inside = (gx >= 0) & (gx < cols) & (gy >= 0) & (gy < rows)
+            query = np.broadcast_to(pending[:, None], gx.shape)[inside]
+            key = (gy * cols + gx)[inside]
+            first = starts[key]
+            counts = starts[key + 1] - first
+            query = np.repeat(query, counts)
+            target = order[np.repeat(first - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())]
+            # Same arithmetic as SpatialGrid.nearest, so distances match bit for bit
+            ddx = tx[target] - qx[start + query]
+            ddy = ty[target] - qy[start + query]
+            d2 = ddx * ddx + ddy * ddy
+
+            before = best_d2.copy()
+            np.minimum.at(best_d2, query, d2)
+            ties[best_d2 < before] = 0
+            hit = d2 == best_d2[query]
+            np.add.at(ties, query[hit], 1)
+            found[query[hit]] = target[hit]
+
+            # Whatever lies beyond ring r is more than r cells away; a hair
+            # less, so a point rounded into the next cell cannot tie unseen
+            reach = (r - 1e-6) * cell
+            bx, by = cx[pending], cy[pending]
+            covered = (bx - r <= 0) & (bx + r >= cols - 1) & (by - r <= 0) & (by + r >= rows - 1)
+            pending = pending[~((best_d2[pending] < reach * reach) | covered)]
+            r += 1
+        best[start:start + n] = found
+        unique[start:start + n] = ties == 1
+    return best, unique
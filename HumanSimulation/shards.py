@@ -0,0 +1,476 @@
+import copy
+import ctypes
+import math
+import multiprocessing
+import os
+import zlib
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from simulation import WIDTH, HEIGHT, TICKS_PER_SECOND, DEFAULT_SETTINGS, Settings
+from streams import STREAMS
+from vector_engine import VectorWorld, MATE_GHOSTS
+
+# Width of the band along each side of a border within which a shard sees
+# its neighbour's targets
+HALO = 128
+
+# Columns of each kind of entity, x first. Humans, animals and plants are
+# handed to another shard when they cross into it; puddles never move and
+# are dealt out once.
+HUMAN_FIELDS = VectorWorld.HUMAN_FIELDS
+ANIMAL_FIELDS = ('animal_x', 'animal_y', 'animal_dx', 'animal_dy')
+PLANT_FIELDS = ('plant_x', 'plant_y')
+PUDDLE_FIELDS = ('puddle_x', 'puddle_y')
+MOVABLE = (HUMAN_FIELDS, ANIMAL_FIELDS, PLANT_FIELDS)
+GROUPS = MOVABLE + (PUDDLE_FIELDS,)
+GROUP_OF = {field: i for i, fields in enumerate(GROUPS) for field in fields}
+# Ghost kinds that change from tick to tick and are exchanged after every
+# one; puddle ghosts are worked out once, as puddles never move
+MOVING_GHOSTS = ('plants', 'animals') + MATE_GHOSTS
+
+# glibc mallopt parameters, see keep_freed_memory
+M_TRIM_THRESHOLD = -1
+M_MMAP_THRESHOLD = -3
+
+
+def max_shards(width):
+    # Most strips a world this wide can be cut into. Ghosts only come from
+    # the next strip over, so a strip narrower than HALO would hide targets
+    # a neighbour's neighbour has within reach.
+    return max(1, int(width // HALO))
+
+
+def shard_rngs(seed, index):
+    # Streams of one shard, independent of every other shard's; a run is
+    # repeatable for a given seed and shard count
+    return {name: np.random.default_rng([seed, index, zlib.crc32(name.encode())]) for name in STREAMS}
+
+
+def shard_settings(settings, shards, index):
+    # Each shard respawns its share of the world's plants and animals, at
+    # random places anywhere in the world; the ones that land elsewhere are
+    # handed over on the next tick
+    def share(total):
+        return total // shards + (index < total % shards)
+
+    return Settings(**{**settings.as_dict(),
+                       'respawn_plants': share(settings.respawn_plants),
+                       'respawn_animals': share(settings.respawn_animals)})
+
+
+def inside(x, left, right):
+    return (x >= left) & (x < right)
+
+
+def take_rows(world, fields, keep):
+    # Remove the rows where keep is False from world and return them. The
+    # last rows kept are moved into the holes, so the cost follows the few
+    # rows leaving rather than the whole shard; the order changes, but the
+    # same way every run.
+    n = len(keep)
+    leaving_at = np.flatnonzero(~keep)
+    rest = n - len(leaving_at)
+    holes = leaving_at[leaving_at < rest]
+    fill = np.flatnonzero(keep[rest:]) + rest
+    leaving = {}
+    for field in fields:
+        column = getattr(world, field)
+        leaving[field] = column[leaving_at]
+        column[holes] = column[fill]
+        setattr(world, field, column[:rest])
+    return leaving
+
+
+def add_rows(world, fields, rows):
+    if not len(rows[fields[0]]):
+        return
+    for field in fields:
+        setattr(world, field, np.concatenate((getattr(world, field), rows[field])))
+
+
+def bands(world, left, right, kinds=MOVING_GHOSTS):
+    # Targets of world within HALO of its left and of its right border, as
+    # ghosts for the neighbours on either side. Everything in world already
+    # lies between the borders, so one comparison per side is enough.
+    sides = ({}, {})
+    for kind, x, y in (('puddles', world.puddle_x, world.puddle_y),
+                       ('plants', world.plant_x, world.plant_y),
+                       ('animals', world.animal_x, world.animal_y)):
+        if kind not in kinds:
+            continue
+        for ghosts, near in zip(sides, (x < left + HALO, x >= right - HALO)):
+            ghosts[kind] = (x[near], y[near])
+    if MATE_GHOSTS[0] not in kinds:
+        return sides
+    # Only the few humans in a band are looked at past the first test
+    for ghosts, near in zip(sides, (world.x < left + HALO, world.x >= right - HALO)):
+        near = np.flatnonzero(near)
+        near = near[~world.sleeping[near]]
+        gender = world.gender[near]
+        for each, kind in enumerate(MATE_GHOSTS):
+            mates = near[gender == each]
+            ghosts[kind] = (world.x[mates], world.y[mates])
+    return sides
+
+
+def merge_ghosts(bands, kinds=MOVING_GHOSTS):
+    # One ghost set from the bands of both neighbours, left one first
+    return {
+        kind: (np.concatenate([b[kind][0] for b in bands] + [np.empty(0)]),
+               np.concatenate([b[kind][1] for b in bands] + [np.empty(0)]))
+        for kind in kinds
+    }
+
+
+def neighbours(index, shards):
+    # Shards whose bands shard index sees: the one to its left, then the
+    # one to its right
+    return [i for i in (index - 1, index + 1) if 0 <= i < shards]
+
+
+def owner(borders, x):
+    # Index of the shard each x belongs to
+    return np.searchsorted(borders, x, side='right')
+
+
+def route(borders, index, leaving):
+    # Rows of every shard's leaving, in shard order, that go to shard index
+    arrivals = []
+    for group, fields in enumerate(MOVABLE):
+        rows = {field: np.concatenate([shard[group][field] for shard in leaving]) for field in fields}
+        mine = owner(borders, rows[fields[0]]) == index
+        arrivals.append({field: column[mine] for field, column in rows.items()})
+    return arrivals
+
+
+def keep_freed_memory():
+    # Every tick allocates and frees NumPy temporaries of a few MB. Left to
+    # itself glibc can end up handing them back to the kernel on every free
+    # and faulting them in again on the next tick, thousands of page faults
+    # a tick that made a lone worker half again slower than the same world
+    # stepped in-process. Fixed thresholds keep them in the heap; anywhere
+    # but glibc this does nothing.
+    try:
+        mallopt = ctypes.CDLL(None).mallopt
+    except (OSError, AttributeError):
+        return
+    mallopt(M_MMAP_THRESHOLD, 32 << 20)
+    mallopt(M_TRIM_THRESHOLD, 128 << 20)
+
+
+def outbox_columns(counts, dtypes):
+    # (key, field, dtype, offset, rows) of every column of an outbox holding
+    # counts rows, in the order Outbox.write lays them out, and the bytes
+    # they take. key is the MOVABLE group of rows that left the strip, or
+    # (side, kind) for a ghost band, whose fields are 0 for x and 1 for y.
+    columns = []
+    offset = 0
+    keys = [(group, fields) for group, fields in enumerate(MOVABLE)]
+    keys += [((side, kind), (0, 1)) for side in (0, 1) for kind in MOVING_GHOSTS]
+    for (key, fields), rows in zip(keys, counts):
+        for field in fields:
+            dtype = np.dtype(float) if isinstance(key, tuple) else dtypes[field]
+            columns.append((key, field, dtype, offset, rows))
+            # Keep every column 8-byte aligned
+            offset += -(-rows * dtype.itemsize // 8) * 8
+    return columns, offset
+
+
+def read_outbox(layout, dtypes, with_bands=True):
+    # (leaving, sides) copied out of a shard's outbox, in the form
+    # take_rows and bands return them; sides is None without with_bands
+    name, counts = layout
+    columns, _ = outbox_columns(counts, dtypes)
+    if not with_bands:
+        columns = [column for column in columns if not isinstance(column[0], tuple)]
+    leaving = [{} for _ in MOVABLE]
+    sides = ({}, {}) if with_bands else None
+    # Most shards hand nothing on to most others, so only attach to blocks
+    # there is something to read from
+    block = shared_memory.SharedMemory(name=name) if any(column[4] for column in columns) else None
+    try:
+        for key, field, dtype, offset, rows in columns:
+            if rows:
+                column = np.ndarray(rows, dtype, buffer=block.buf, offset=offset).copy()
+            else:
+                column = np.empty(0, dtype)
+            if isinstance(key, tuple):
+                side, kind = key
+                sides[side][kind] = sides[side].get(kind, ()) + (column,)
+            else:
+                leaving[key][field] = column
+    finally:
+        if block is not None:
+            block.close()
+    return leaving, sides
+
+
+# Outbox Class
+# Shared memory a worker leaves what it hands on after every tick in: the
+# rows that left its strip and its ghost bands, column after column. Only
+# the block's name and the row counts go through the pipe, and the other
+# workers read what they need straight out of the block. Two blocks are
+# used in turn, so the next tick's hand-offs never overwrite ones a
+# neighbour may still be reading.
+class Outbox:
+    def __init__(self, dtypes):
+        self.dtypes = dtypes
+        self.blocks = [None, None]
+
+    def write(self, tick, leaving, sides):
+        # Fill this tick's block and return its layout for read_outbox
+        counts = tuple(len(rows[fields[0]]) for rows, fields in zip(leaving, MOVABLE))
+        counts += tuple(len(sides[side][kind][0]) for side in (0, 1) for kind in MOVING_GHOSTS)
+        columns, size = outbox_columns(counts, self.dtypes)
+        turn = tick % 2
+        block = self.blocks[turn]
+        if block is None or block.size < size:
+            if block is not None:
+                block.close()
+                block.unlink()
+            block = self.blocks[turn] = shared_memory.SharedMemory(create=True, size=size * 3 // 2 + 64)
+        for key, field, dtype, offset, rows in columns:
+            if isinstance(key, tuple):
+                side, kind = key
+                values = sides[side][kind][field]
+            else:
+                values = leaving[key][field]
+            np.ndarray(rows, dtype, buffer=block.buf, offset=offset)[:] = values
+        return block.name, counts
+
+    def close(self):
+        for block in self.blocks:
+            if block is not None:
+                block.close()
+                block.unlink()
+        self.blocks = [None, None]
+
+
+def run_shard(pipe, world, index, bounds, dtypes, ghosts, puddles):
+    # Worker process: owns the world of one strip and steps it whenever the
+    # coordinator says so. Each step comes with the outbox layouts of every
+    # shard from the tick before, from which the worker picks the rows that
+    # crossed into its strip and its neighbours' bands; until the first
+    # tick it has the ghosts it was started with. puddles are its puddle
+    # ghosts for the whole run.
+    keep_freed_memory()
+    left, right = bounds[index]
+    borders = np.array([left for left, _ in bounds[1:]])
+    near = neighbours(index, len(bounds))
+    outbox = Outbox(dtypes)
+    while True:
+        command, payload = pipe.recv()
+        if command == 'step':
+            if payload is not None:
+                inboxes = [read_outbox(layout, dtypes, i in near) for i, layout in enumerate(payload)]
+                for fields, rows in zip(MOVABLE, route(borders, index, [leaving for leaving, _ in inboxes])):
+                    add_rows(world, fields, rows)
+                # The left neighbour's right band, then the right one's left band
+                ghosts = merge_ghosts([inboxes[i][1][0 if i > index else 1] for i in near])
+            world.ghosts = {**ghosts, 'puddles': puddles}
+            world.step()
+            leaving = [take_rows(world, fields, inside(getattr(world, fields[0]), left, right)) for fields in MOVABLE]
+            counts = tuple(len(getattr(world, fields[0])) for fields in GROUPS)
+            pipe.send((outbox.write(world.tick, leaving, bands(world, left, right)), counts, world.max_generation))
+        elif command == 'publish':
+            # Copy columns into the coordinator's shared memory block, one
+            # after the other, so nothing big goes through the pipe
+            name, fields = payload
+            block = shared_memory.SharedMemory(name=name)
+            offset = 0
+            for field in fields:
+                column = getattr(world, field)
+                np.ndarray(column.shape, column.dtype, buffer=block.buf, offset=offset)[:] = column
+                offset += column.nbytes
+            block.close()
+            pipe.send(None)
+        elif command == 'close':
+            outbox.close()
+            pipe.close()
+            return
+
+
+# ShardedWorld Class
+# VectorWorld split into vertical strips, each stepped in its own worker
+# process. After every tick the humans, animals and plants that left a strip
+# are handed to the shard they are now in, and each shard reads its
+# neighbours' moving targets within HALO of the border out of their
+# outboxes. Puddles never move, so the ones across a border are given to
+# the shard once when it starts. Those ghosts can be headed for, drunk
+# from and bred with, but food is only eaten by a human on the owner's
+# side. Everything crossing between shards is routed in shard
+# order, so a run is repeatable for a given seed and shard count, though
+# not the same as an unsplit VectorWorld's.
+class ShardedWorld:
+    def __init__(self, num_humans=10, num_puddles=5, num_plants=10, num_animals=5, seed=None, settings=DEFAULT_SETTINGS,
+                 width=WIDTH, height=HEIGHT, shards=None):
+        # One per core by default, as many as the width allows
+        if shards is None:
+            shards = min(os.cpu_count() or 1, max_shards(width))
+        elif not 1 <= shards <= max_shards(width):
+            raise ValueError(f"a world {width} wide takes 1 to {max_shards(width)} shards, not {shards}")
+        # Start from exactly the world VectorWorld builds, cut into strips
+        whole = VectorWorld(num_humans, num_puddles, num_plants, num_animals, seed=seed, settings=settings,
+                            width=width, height=height)
+        self.seed = whole.seed
+        self.settings = settings
+        self.width = width
+        self.height = height
+        self.tick = 0
+        self.max_generation = whole.max_generation
+        self.dtypes = {field: getattr(whole, field).dtype for field in GROUP_OF}
+
+        # Inner borders; the outer strips reach past the world's edges, so
+        # every position has an owner
+        edges = [width * i / shards for i in range(shards + 1)]
+        self.borders = np.array(edges[1:-1])
+        bounds = [(-math.inf if i == 0 else edges[i], math.inf if i == shards - 1 else edges[i + 1]) for i in range(shards)]
+
+        worlds = []
+        for index, (left, right) in enumerate(bounds):
+            world = copy.copy(whole)
+            for fields in GROUPS:
+                mine = inside(getattr(whole, fields[0]), left, right)
+                for field in fields:
+                    setattr(world, field, getattr(whole, field)[mine])
+            world.settings = shard_settings(settings, shards, index)
+            world.rngs = shard_rngs(self.seed, index)
+            worlds.append(world)
+        self.counts = [tuple(len(getattr(world, fields[0])) for fields in GROUPS) for world in worlds]
+        # Where each shard's last hand-offs are, None before the first tick
+        self.outboxes = None
+        sides = [bands(world, left, right, MOVING_GHOSTS + ('puddles',)) for world, (left, right) in zip(worlds, bounds)]
+
+        # Workers must share the coordinator's resource tracker, or each one
+        # would start its own and try to clean up blocks the coordinator owns
+        resource_tracker.ensure_running()
+        context = multiprocessing.get_context()
+        self.pipes = []
+        self.processes = []
+        for index, world in enumerate(worlds):
+            near = [sides[i][0 if i > index else 1] for i in neighbours(index, shards)]
+            ghosts = merge_ghosts(near)
+            puddles = merge_ghosts(near, ('puddles',))['puddles']
+            pipe, child = context.Pipe()
+            process = context.Process(target=run_shard, args=(child, world, index, bounds, self.dtypes, ghosts, puddles),
+                                      daemon=True)
+            process.start()
+            child.close()
+            self.pipes.append(pipe)
+            self.processes.append(process)
+        # Shared memory block per shard for columns(), grown on demand
+        self.blocks = [None] * shards
+
+    def __len__(self):
+        # Humans in flight between shards count too
+        arriving = sum(counts[0] for _, counts in self.outboxes or ())
+        return sum(counts[0] for counts in self.counts) + arriving
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def shards(self):
+        return len(self.pipes)
+
+    def step(self):
+        # Advance every shard one tick in parallel. Each one picks up what
+        # the others handed on the tick before from their outboxes, so only
+        # where to find those goes through the pipes.
+        for pipe in self.pipes:
+            pipe.send(('step', self.outboxes))
+        replies = [pipe.recv() for pipe in self.pipes]
+        self.tick += 1
+        self.outboxes = [reply[0] for reply in replies]
+        self.counts = [reply[1] for reply in replies]
+        self.max_generation = max(self.max_generation, *(reply[2] for reply in replies))
+
+    def run(self, ticks):
+        # Fast-forward: step as fast as possible, stopping early on extinction
+        for _ in range(ticks):
+            if not len(self):
+                break
+            self.step()
+
+    def columns(self, fields=('x', 'y')):
+        # Columns of the whole world, shard after shard, copied out of shared
+        # memory the workers write them into. Every field must belong to the
+        # same kind of entity.
+        group = GROUP_OF[fields[0]]
+        if any(GROUP_OF[field] != group for field in fields):
+            raise ValueError("columns() fields must all be of one kind of entity")
+        itemsize = sum(self.dtypes[field].itemsize for field in fields)
+        for index, pipe in enumerate(self.pipes):
+            size = max(1, self.counts[index][group] * itemsize)
+            block = self.blocks[index]
+            if block is None or block.size < size:
+                if block is not None:
+                    block.close()
+                    block.unlink()
+                block = self.blocks[index] = shared_memory.SharedMemory(create=True, size=size * 3 // 2 + 1)
+            pipe.send(('publish', (block.name, fields)))
+        for pipe in self.pipes:
+            pipe.recv()
+
+        arrivals = None
+        if self.outboxes is not None and group < len(MOVABLE):
+            leaving = [read_outbox(layout, self.dtypes, False)[0] for layout in self.outboxes]
+            arrivals = [route(self.borders, index, leaving) for index in range(self.shards)]
+        parts = {field: [] for field in fields}
+        for index, block in enumerate(self.blocks):
+            n = self.counts[index][group]
+            offset = 0
+            for field in fields:
+                dtype = self.dtypes[field]
+                parts[field].append(np.ndarray(n, dtype, buffer=block.buf, offset=offset).copy())
+                offset += n * dtype.itemsize
+            # Rows on their way to this shard belong to it already
+            if arrivals is not None:
+                for field in fields:
+                    parts[field].append(arrivals[index][group][field])
+        return {field: np.concatenate(columns) for field, columns in parts.items()}
+
+    def close(self):
+        for pipe in self.pipes:
+            pipe.send(('close', None))
+        for process in self.processes:
+            process.join()
+        for block in self.blocks:
+            if block is not None:
+                block.close()
+                block.unlink()
+        self.pipes = []
+        self.processes = []
+        self.blocks = []
+
+
+# Headless run: python shards.py [ticks] [humans] [seed] [--shards N]
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Run the vector engine split over worker processes")
+    parser.add_argument('ticks', type=int, nargs='?', default=3600)
+    parser.add_argument('humans', type=int, nargs='?', default=10)
+    parser.add_argument('seed', type=int, nargs='?')
+    parser.add_argument('--shards', type=int, help="worker processes (default: one per core, at most width / 128)")
+    parser.add_argument('--size', type=int, nargs=2, default=(WIDTH, HEIGHT), metavar=('W', 'H'), help="world size in pixels")
+    args = parser.parse_args()
+    if args.shards is not None and not 1 <= args.shards <= max_shards(args.size[0]):
+        parser.error(f"--shards must be 1 to {max_shards(args.size[0])} for a world {args.size[0]} wide")
+
+    scale = max(1, args.humans // 10)
+    with ShardedWorld(args.humans, num_puddles=5 * scale, num_plants=10 * scale, num_animals=5 * scale, seed=args.seed,
+                      width=args.size[0], height=args.size[1], shards=args.shards) as world:
+        start = time.perf_counter()
+        world.run(args.ticks)
+        elapsed = time.perf_counter() - start
+        animals = sum(counts[1] for counts in world.counts)
+        plants = sum(counts[2] for counts in world.counts)
+        print(f"seed={world.seed} shards={world.shards} tick={world.tick} ({world.tick / TICKS_PER_SECOND:.1f}s) "
+              f"humans={len(world)} animals={animals} plants={plants} ticks/s={world.tick / elapsed:.0f}")
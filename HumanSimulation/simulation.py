@@ -0,0 +1,876 @@
+import heapq
+import random
+import math
+
+from chunks import ChunkMap, ACTIVITY_INTERVAL
+from entities import EntityStore
+from resources import ResourcePool
+from spatial import SpatialGrid, object_position, value_key
+from genealogy import Genealogy, NO_PARENT
+from proximity import Contacts, PUDDLE_CONTACT, ANIMAL_CONTACT, PLANT_CONTACT, MATE_CONTACT, distance2
+from streams import RandomStreams
+from telemetry import BIRTH, DEATH, EAT, DRINK, SLEEP, WAKE, ANIMAL, PLANT, NO_DETAIL, death_cause
+
+# Default world size, the same as the window; World takes any other
+WIDTH, HEIGHT = 800, 600
+
+# Simulated clock
+# Everything is timed in ticks rather than wall-clock milliseconds, so a run
+# gives the same outcome whether it is played at 60 ticks per second or
+# fast-forwarded as fast as the CPU allows.
+TICKS_PER_SECOND = 60
+AGE_INTERVAL = 2 * TICKS_PER_SECOND  # 2 seconds
+RESPAWN_INTERVAL = 60 * TICKS_PER_SECOND  # 60 seconds
+BREED_COOLDOWN = 45 * TICKS_PER_SECOND  # 45 seconds
+SLEEP_DURATION = 10 * TICKS_PER_SECOND  # 10 seconds
+
+# Puddle size in pixels, the same for every puddle
+PUDDLE_WIDTH, PUDDLE_HEIGHT = 60, 30  # Larger puddles
+
+# Genders are stored as small ints instead of strings
+MALE, FEMALE = 0, 1
+
+
+# Settings Class
+# Tunable constants of one run. The defaults are the hand-tuned values;
+# sweep.py builds Settings with overrides to explore other ones.
+class Settings:
+    def __init__(self, **overrides):
+        self.water_decay = 0.05  # per tick
+        self.hunger_decay = 0.03  # per tick
+        self.energy_decay = 0.02  # per tick, while awake
+        self.breed_cooldown = BREED_COOLDOWN
+        self.death_age_min = 70
+        self.death_age_max = 100
+        self.respawn_interval = RESPAWN_INTERVAL
+        self.respawn_plants = 20
+        self.respawn_animals = 10
+
+        for name, value in overrides.items():
+            if not hasattr(self, name):
+                raise TypeError(f"unknown setting {name!r}")
+            setattr(self, name, value)
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+DEFAULT_SETTINGS = Settings()
+
+
+# Never, for a stat that does not fall
+NEVER = math.inf
+
+
+def crossing(start, value, decay, limit, strict=True):
+    # First tick from start on at which value, falling by decay every tick
+    # after start, is below limit (or at most limit when not strict). The
+    # answer agrees exactly with value - decay * ticks, rounding included.
+    def crossed(ticks):
+        current = value - decay * ticks
+        return current < limit if strict else current <= limit
+
+    if crossed(0):
+        return start
+    if decay <= 0:
+        return NEVER
+    ticks = max(1, int((value - limit) / decay))
+    while not crossed(ticks):
+        ticks += 1
+    while ticks > 1 and crossed(ticks - 1):
+        ticks -= 1
+    return start + ticks
+
+
+# Human Class
+# Slotted: no per-instance __dict__, so each human is smaller and attribute
+# access is faster. Constants shared by every human live on the class or in
+# Settings rather than on each instance.
+#
+# Water, hunger and energy only ever fall at a fixed rate between the events
+# that set them (drinking, eating, falling asleep, waking), so they are not
+# written every tick. Each is stored as it stood at last_update, and the
+# ticks at which they cross what move() and update_stats() act on are worked
+# out whenever they are set; every tick only compares the clock with those.
+class Human:
+    __slots__ = (
+        'id', 'mother_id', 'father_id', 'x', 'y', 'water', 'hunger', 'energy', 'age',
+        'death_age', 'generation', 'alive', 'dx', 'dy', 'change_direction_timer',
+        'sleeping', 'wake_at', 'target_animal', 'target_plant',
+        'target_mate', 'gender', 'last_breed_time', 'last_update',
+        'thirsty_at', 'hungry_at', 'tired_at', 'dies_at', 'parked_at',
+    )
+    speed = 1
+
+    def __init__(self, x, y, generation=1, rng=random, settings=DEFAULT_SETTINGS, tick=0):
+        self.id = None  # assigned by World.add_human
+        self.mother_id = NO_PARENT
+        self.father_id = NO_PARENT
+        self.x = x
+        self.y = y
+        self.water = 100
+        self.hunger = 100
+        self.energy = 100
+        self.last_update = tick  # tick the three stats above are as of
+        self.age = 0
+        self.death_age = rng.randint(settings.death_age_min, settings.death_age_max)  # Random death age between 70 and 100
+        self.generation = generation
+        self.alive = True
+        self.dx = rng.uniform(-1, 1)
+        self.dy = rng.uniform(-1, 1)
+        self.change_direction_timer = 0
+        self.sleeping = False
+        self.wake_at = 0
+        self.target_animal = None
+        self.target_plant = None
+        self.target_mate = None
+        self.gender = rng.choice((MALE, FEMALE))
+        self.last_breed_time = 0
+        self.parked_at = None  # tick it left World.active, see World.park
+        self.retime(settings)
+
+    def stats_at(self, tick, settings=DEFAULT_SETTINGS):
+        # (water, hunger, energy) at tick; water and hunger keep falling while
+        # asleep, energy only while awake
+        ticks = tick - self.last_update
+        energy = self.energy if self.sleeping else self.energy - settings.energy_decay * ticks
+        return self.water - settings.water_decay * ticks, self.hunger - settings.hunger_decay * ticks, energy
+
+    def settle(self, tick, settings=DEFAULT_SETTINGS):
+        # Store the stats as they are at tick, before one of them is set
+        self.water, self.hunger, self.energy = self.stats_at(tick, settings)
+        self.last_update = tick
+
+    def retime(self, settings=DEFAULT_SETTINGS):
+        # Work out the crossing ticks from the stored stats
+        start = self.last_update
+        energy_decay = 0 if self.sleeping else settings.energy_decay
+        self.thirsty_at = crossing(start, self.water, settings.water_decay, 80)
+        self.hungry_at = crossing(start, self.hunger, settings.hunger_decay, 50)
+        self.tired_at = crossing(start, self.energy, energy_decay, 50)
+        self.dies_at = min(
+            crossing(start, self.water, settings.water_decay, 0, strict=False),
+            crossing(start, self.hunger, settings.hunger_decay, 0, strict=False),
+            crossing(start, self.energy, energy_decay, 0, strict=False),
+        )
+
+    def update_stats(self, tick, settings=DEFAULT_SETTINGS):
+        if not self.alive:
+            return
+
+        # Water and hunger keep decreasing even when sleeping
+        if self.sleeping:
+            if tick >= self.wake_at:
+                self.settle(tick, settings)
+                self.energy = 100
+                self.sleeping = False
+                self.retime(settings)
+        # Check if the human is still alive
+        elif tick >= self.dies_at or self.age >= self.death_age:
+            self.settle(tick, settings)
+            self.alive = False
+
+    def move(self, world):
+        if not self.alive or self.sleeping:
+            return
+
+        tick = world.tick
+        thirsty = tick >= self.thirsty_at
+        hungry = tick >= self.hungry_at
+
+        # Food claims only last while the human is actually going for food
+        if (thirsty or not hungry) and (self.target_animal is not None or self.target_plant is not None):
+            world.release_claims(self)
+
+        # Priority: Water -> Food -> Sleep -> Breeding -> Roaming
+        if thirsty:
+            self.seek_water(world)
+        elif hungry:
+            self.seek_food(world)
+        elif tick >= self.tired_at:
+            self.settle(tick, world.settings)
+            self.sleeping = True
+            self.wake_at = tick + SLEEP_DURATION
+            self.retime(world.settings)
+        elif self.age > 25:
+            if tick - self.last_breed_time >= world.settings.breed_cooldown:
+                self.breed(world)
+        else:
+            self.random_movement(world.streams.movement, world.width, world.height)
+
+    def seek_water(self, world):
+        # World.batch_nearest may have looked the puddle up already
+        puddle = world.nearest_puddles.get(self)
+        if puddle is None:
+            puddle = world.puddle_grid.nearest(self.x, self.y)
+        if puddle is not None:
+            self.move_towards(*world.puddles.position(puddle))
+            world.contacts.add(self, PUDDLE_CONTACT, puddle)
+
+    def seek_food(self, world):
+        # Targets are normally handed out by World.assign_food; a human it did
+        # not expect to be hungry claims the nearest free one itself
+        if self.target_animal is None or self.target_animal.hunter is not self:
+            self.target_animal = world.claim_animal(self)
+
+        if self.target_animal is not None:
+            self.move_towards(self.target_animal.x, self.target_animal.y)
+            world.contacts.add(self, ANIMAL_CONTACT, self.target_animal)
+        elif self.target_plant is None or world.plant_claims.get(self.target_plant) is not self:
+            self.target_plant = world.claim_plant(self)
+
+        if self.target_plant is not None:
+            self.move_towards(*world.plants.position(self.target_plant))
+            world.contacts.add(self, PLANT_CONTACT, self.target_plant)
+
+    # Contact handlers, called by World.resolve_contacts once everyone has
+    # moved and the human turned out to be in range of its target
+    def drink(self, world, puddle):
+        self.settle(world.tick, world.settings)
+        self.water = 100
+        self.retime(world.settings)
+        world.emit(DRINK, self)
+
+    def eat_animal(self, world, animal):
+        world.remove_animal(animal)
+        self.settle(world.tick, world.settings)
+        self.hunger = 100
+        self.retime(world.settings)
+        self.target_animal = None
+        world.emit(EAT, self, ANIMAL)
+
+    def eat_plant(self, world, plant):
+        # Claimed, so nobody else can have eaten it on the way
+        world.remove_plant(plant)
+        self.settle(world.tick, world.settings)
+        self.hunger = min(100, self.hunger + 20)
+        self.retime(world.settings)
+        self.target_plant = None
+        world.emit(EAT, self, PLANT)
+
+    def is_mate_for(self, other):
+        return self.gender != other.gender and self.alive and not self.sleeping
+
+    def breed(self, world):
+        if not self.target_mate or not self.target_mate.is_mate_for(self):
+            opposite = FEMALE if self.gender == MALE else MALE
+            self.target_mate = world.mate_grids[opposite].nearest(self.x, self.y)
+
+        if self.target_mate:
+            self.move_towards(self.target_mate.x, self.target_mate.y)
+            world.contacts.add(self, MATE_CONTACT, self.target_mate)
+
+    def mate_with(self, world, mate):
+        # The mate may have died or fallen asleep after this human moved
+        if not mate.is_mate_for(self):
+            return
+        # Check if breeding cooldown is complete
+        if world.tick - self.last_breed_time >= world.settings.breed_cooldown:
+            # Create a new human
+            rng = world.streams.breeding
+            new_x = self.x + rng.randint(-20, 20)
+            new_y = self.y + rng.randint(-20, 20)
+            new_generation = self.generation + 1
+            child = Human(new_x, new_y, generation=new_generation, rng=world.streams.births, settings=world.settings,
+                          tick=world.tick)
+            mother, father = (self, mate) if self.gender == FEMALE else (mate, self)
+            child.mother_id = mother.id
+            child.father_id = father.id
+            world.add_human(child)
+            world.emit(BIRTH, child)
+            self.last_breed_time = world.tick  # Update last breed time
+            self.target_mate = None
+
+    def move_towards(self, target_x, target_y):
+        direction_x = target_x - self.x
+        direction_y = target_y - self.y
+        distance = math.hypot(direction_x, direction_y)
+
+        if distance > 0:
+            self.dx = direction_x / distance
+            self.dy = direction_y / distance
+
+        speed = self.speed
+        self.x += self.dx * speed
+        self.y += self.dy * speed
+
+    def random_movement(self, rng=random, width=WIDTH, height=HEIGHT):
+        speed = self.speed
+        self.x += self.dx * speed
+        self.y += self.dy * speed
+
+        if self.x < 0 or self.x > width:
+            self.dx *= -1
+        if self.y < 0 or self.y > height:
+            self.dy *= -1
+
+        self.x = max(0, min(width, self.x))
+        self.y = max(0, min(height, self.y))
+
+        self.change_direction_timer += 1
+        if self.change_direction_timer >= 60:
+            self.dx = rng.uniform(-1, 1)
+            self.dy = rng.uniform(-1, 1)
+            self.change_direction_timer = 0
+
+
+# Animal Class
+class Animal:
+    __slots__ = ('x', 'y', 'dx', 'dy', 'hunter')
+    speed = 0.6  # Increased speed
+
+    def __init__(self, x, y, rng=random):
+        self.x = x
+        self.y = y
+        self.dx = rng.uniform(-0.5, 0.5)
+        self.dy = rng.uniform(-0.5, 0.5)
+        self.hunter = None  # the one human allowed to chase it, see World.assign_food
+
+    def move(self, width=WIDTH, height=HEIGHT, steps=1):
+        # steps > 1 covers several ticks at once, for animals far from anyone
+        speed = self.speed * steps
+        self.x += self.dx * speed
+        self.y += self.dy * speed
+
+        if self.x < 0 or self.x > width:
+            self.dx *= -1
+        if self.y < 0 or self.y > height:
+            self.dy *= -1
+
+        self.x = max(0, min(width, self.x))
+        self.y = max(0, min(height, self.y))
+
+
+def assign_closest(seekers, grid, position, free, take, available):
+    # Greedy closest-pair matching of seekers to free targets in grid. Every
+    # seeker proposes its nearest free target and the closest proposal is
+    # taken first; a seeker whose target went to someone closer proposes
+    # again, until everyone has a target or nothing is left. available is
+    # how many targets are free: once none are, nobody searches the grid
+    # again, as a search for a free target that is not there covers all of it.
+    if not available:
+        return
+    queue = []
+
+    def propose(human):
+        target = grid.nearest(human.x, human.y, accept=free)
+        if target is not None:
+            tx, ty = position(target)
+            heapq.heappush(queue, (distance2(human.x, human.y, tx, ty), human.id, human, target))
+
+    for human in seekers:
+        propose(human)
+    while queue and available:
+        _, _, human, target = heapq.heappop(queue)
+        if free(target):
+            take(human, target)
+            available -= 1
+        else:
+            propose(human)
+
+
+# World Class
+# Owns every entity and advances the simulation without touching pygame, so it
+# can run on machines with no display. main5.py wraps it in a window.
+class World:
+    def __init__(self, num_humans=10, num_puddles=5, num_plants=10, num_animals=5, seed=None, settings=DEFAULT_SETTINGS,
+                 width=WIDTH, height=HEIGHT):
+        # Same seed, sizes and settings give the same run, tick for tick
+        self.streams = RandomStreams(seed)
+        self.settings = settings
+        self.width = width
+        self.height = height
+        spawn = self.streams.spawn
+        births = self.streams.births
+
+        # Create initial humans, plants, and animals
+        self.humans = EntityStore(Human(spawn.randint(0, width), spawn.randint(0, height), rng=births, settings=settings) for _ in range(num_humans))
+        # The humans step visits: everyone but the sleepers and idle adults
+        # waiting in self.wakeups, who cost nothing until their wake-up tick
+        self.active = EntityStore(self.humans)
+        self.wakeups = []  # heap of (wake-up tick, id, human)
+        # Every human ever born, by id; the founders are ids 0 to num_humans - 1
+        self.genealogy = Genealogy()
+        for human in self.humans:
+            human.id = self.genealogy.add(human.generation, 0)
+        self.puddles = ResourcePool((spawn.randint(0, width), spawn.randint(0, height)) for _ in range(num_puddles))
+        self.plants = ResourcePool((spawn.randint(0, width), spawn.randint(0, height)) for _ in range(num_plants))
+        self.animals = EntityStore(Animal(spawn.randint(0, width), spawn.randint(0, height), rng=spawn) for _ in range(num_animals))
+
+        # Spatial indexes for nearest-target lookups, kept in step with the
+        # lists above as entities move, spawn and get removed
+        self.puddle_grid = SpatialGrid(position=self.puddles.position, key=value_key)
+        self.plant_grid = SpatialGrid(position=self.plants.position, key=value_key)
+        self.animal_grid = SpatialGrid()
+        # Awake, living humans by gender: the candidates for breeding
+        self.mate_grids = (SpatialGrid(), SpatialGrid())  # indexed by MALE, FEMALE
+        # The same entities again by chunk, for drawing and for deciding
+        # where the world is worth simulating every tick
+        self.chunks = ChunkMap(width, height, self.puddles, self.plants)
+        for puddle in self.puddles:
+            self.puddle_grid.insert(puddle)
+            self.chunks.puddles.insert(puddle)
+        for plant in self.plants:
+            self.plant_grid.insert(plant)
+            self.chunks.plants.insert(plant)
+        for animal in self.animals:
+            self.animal_grid.insert(animal)
+            self.chunks.animals.insert(animal)
+        for human in self.humans:
+            self.mate_grids[human.gender].insert(human)
+            self.chunks.humans.insert(human)
+        self.puddle_grid.rebalance()
+        self.rebalance_grids()
+        self.chunks.refresh()
+        # Targets the humans went for this tick, tested once they have all moved
+        self.contacts = Contacts(self.puddles.position, self.plants.position)
+
+        self.tick = 0
+        self.last_age_update = 0
+        self.last_respawn_time = 0
+        # Bumped whenever plants or puddles change, so viewers can cache them
+        self.static_version = 0
+        self.max_generation = max((human.generation for human in self.humans), default=0)
+        # Optional telemetry.Telemetry receiving events and per-tick samples
+        self.telemetry = None
+        # Humans the last tick left about to look for water or for food, for
+        # batch_nearest and assign_food
+        self.thirsty = []
+        self.hungry = []
+        # batch_nearest's answers for this tick, by human
+        self.nearest_puddles = {}
+        # Plant handle -> the one human allowed to go for it; animals carry
+        # their claimant themselves
+        self.plant_claims = {}
+        # Animals with a hunter, so the free ones are counted without a search
+        self.claimed_animals = 0
+
+    def __getstate__(self):
+        # Telemetry owns open files; a loaded world starts without any
+        state = dict(vars(self))
+        state['telemetry'] = None
+        return state
+
+    def __len__(self):
+        return len(self.humans)
+
+    def reseed(self, seed):
+        # Fresh random streams from this tick on, e.g. to fork one saved state
+        # into several diverging runs
+        self.streams = RandomStreams(seed)
+
+    def apply_settings(self, settings):
+        # Switch settings mid-run: the stats so far fell at the old rates,
+        # and every crossing tick is worked out again at the new ones, as is
+        # the wake-up tick of every idle adult
+        for human in self.humans:
+            if human.parked_at is not None:
+                human.age += self.age_steps(human.parked_at, self.tick)
+                human.parked_at = self.tick
+            human.settle(self.tick, self.settings)
+            human.retime(settings)
+        self.settings = settings
+        self.wakeups = [(human.wake_at if human.sleeping else self.idle_until(human), human.id, human)
+                        for _, _, human in self.wakeups]
+        heapq.heapify(self.wakeups)
+
+    def add_human(self, human):
+        human.id = self.genealogy.add(human.generation, self.tick, human.mother_id, human.father_id)
+        self.humans.add(human)
+        self.active.add(human)
+        self.mate_grids[human.gender].insert(human)
+        self.chunks.humans.insert(human)
+        self.max_generation = max(self.max_generation, human.generation)
+
+    def emit(self, kind, human, detail=NO_DETAIL):
+        if self.telemetry is not None:
+            self.telemetry.record(self.tick, kind, human, detail)
+
+    def add_plant(self, x, y):
+        plant = self.plants.add(x, y)
+        self.plant_grid.insert(plant)
+        self.chunks.plants.insert(plant)
+        self.static_version += 1
+        return plant
+
+    def add_animal(self, animal):
+        self.animals.add(animal)
+        self.animal_grid.insert(animal)
+        self.chunks.animals.insert(animal)
+
+    def remove_plant(self, plant):
+        self.plant_claims.pop(plant, None)
+        self.plants.remove(plant)
+        self.plant_grid.remove(plant)
+        self.chunks.plants.remove(plant)
+        self.static_version += 1
+
+    def remove_animal(self, animal):
+        if animal.hunter is not None:
+            animal.hunter = None
+            self.claimed_animals -= 1
+        self.animals.remove(animal)
+        self.animal_grid.remove(animal)
+        self.chunks.animals.remove(animal)
+
+    # Wake-up scheduling: a human that will do nothing for a while leaves the
+    # per-tick loop until the tick it has something to do again, and its age
+    # is brought up to date in closed form when it comes back; its other
+    # stats are lazy anyway. That is a sleeper until update_stats wakes it
+    # (sleepers can only die once awake), or an adult on breeding cooldown
+    # with no need, which stands still until idle_until.
+    def park(self, human, wake_at):
+        human.parked_at = self.tick
+        self.active.remove(human)
+        heapq.heappush(self.wakeups, (wake_at, human.id, human))
+
+    def idle_until(self, human):
+        # First tick an awake adult that stands still has something to do:
+        # a need, the end of its breeding cooldown, its death from one of
+        # those, or the age update that brings it to its death age. Being
+        # bred with changes nothing about the partner, so none of these move.
+        return min(
+            human.thirsty_at, human.hungry_at, human.tired_at, human.dies_at,
+            human.last_breed_time + self.settings.breed_cooldown,
+            self.last_age_update + (human.death_age - human.age) * AGE_INTERVAL,
+        )
+
+    def park_if_idle(self, human):
+        # Called for a living, awake human after it moved this tick. Under
+        # 25 it roams, and a later tick with nothing to do is only worth
+        # skipping to if there is at least one tick in between.
+        if human.age > 25:
+            wake_at = self.idle_until(human)
+            if wake_at > self.tick + 1:
+                self.park(human, wake_at)
+
+    def age_steps(self, start, end):
+        # Age updates after tick start up to and including tick end
+        anchor = self.last_age_update
+        return (end - anchor) // AGE_INTERVAL - (start - anchor) // AGE_INTERVAL
+
+    def wake_due(self):
+        # Put the sleepers who wake this tick back in the loop, as they would
+        # have been after the last tick, so this tick's update_stats wakes them
+        wakeups = self.wakeups
+        tick = self.tick
+        while wakeups and wakeups[0][0] <= tick:
+            _, _, human = heapq.heappop(wakeups)
+            human.age += self.age_steps(human.parked_at, tick - 1)
+            human.parked_at = None
+            self.active.add(human)
+            self.flag_needs(human, tick)
+
+    def current_stats(self, human):
+        # (water, hunger, energy, age) of a living human as of this tick; a
+        # parked human's age stands still until it comes back
+        water, hunger, energy = human.stats_at(self.tick, self.settings)
+        age = human.age
+        if human.parked_at is not None:
+            age += self.age_steps(human.parked_at, self.tick)
+        return water, hunger, energy, age
+
+    def batch_nearest(self):
+        # Answer the coming nearest-puddle lookups in one vectorized pass,
+        # storing them where seek_water looks first. Puddles never change, so
+        # each answer is exactly what the grid would return when asked. The
+        # answers only hold for this tick; step() drops them once everyone
+        # has moved, so a human flagged but then not thirsty keeps none.
+        thirsty = self.thirsty
+        self.nearest_puddles = {human: puddle for human, puddle in zip(thirsty, self.puddles.nearest_many(thirsty))
+                                if puddle is not None}
+
+    # Food claims: each animal or plant is chased by at most one human, so
+    # nobody walks towards food that someone else is about to eat
+    def unclaimed_animal(self, animal):
+        return animal.hunter is None
+
+    def unclaimed_plant(self, plant):
+        return plant not in self.plant_claims
+
+    def free_animals(self):
+        return len(self.animals) - self.claimed_animals
+
+    def free_plants(self):
+        return len(self.plants) - len(self.plant_claims)
+
+    def take_animal(self, human, animal):
+        animal.hunter = human
+        human.target_animal = animal
+        self.claimed_animals += 1
+
+    def take_plant(self, human, plant):
+        self.plant_claims[plant] = human
+        human.target_plant = plant
+
+    def claim_animal(self, human):
+        # Nearest animal nobody else is after, or None
+        if not self.free_animals():
+            return None
+        animal = self.animal_grid.nearest(human.x, human.y, accept=self.unclaimed_animal)
+        if animal is not None:
+            self.take_animal(human, animal)
+        return animal
+
+    def claim_plant(self, human):
+        if not self.free_plants():
+            return None
+        plant = self.plant_grid.nearest(human.x, human.y, accept=self.unclaimed_plant)
+        if plant is not None:
+            self.take_plant(human, plant)
+        return plant
+
+    def release_claims(self, human):
+        animal = human.target_animal
+        if animal is not None and animal.hunter is human:
+            animal.hunter = None
+            self.claimed_animals -= 1
+        plant = human.target_plant
+        if plant is not None and self.plant_claims.get(plant) is human:
+            del self.plant_claims[plant]
+        human.target_animal = None
+        human.target_plant = None
+
+    def assign_food(self):
+        # Hand out food to every human expected to look for some this tick
+        # before anyone moves, closest human-food pairs first. The result
+        # depends only on positions (ties go to the lower human id), never on
+        # the order humans act in. Plants are only sought once the animals
+        # are all gone.
+        if self.animals:
+            seekers = [human for human in self.hungry
+                       if human.alive and (human.target_animal is None or human.target_animal.hunter is not human)]
+            assign_closest(seekers, self.animal_grid, object_position, self.unclaimed_animal, self.take_animal,
+                           self.free_animals())
+        else:
+            seekers = [human for human in self.hungry
+                       if human.alive and (human.target_plant is None or self.plant_claims.get(human.target_plant) is not human)]
+            assign_closest(seekers, self.plant_grid, self.plants.position, self.unclaimed_plant, self.take_plant,
+                           self.free_plants())
+
+    def flag_needs(self, human, tick=None):
+        # Flag whether the human will seek water or food on tick (the next
+        # one by default), following the order of Human.move, for
+        # batch_nearest and assign_food
+        if tick is None:
+            tick = self.tick + 1
+        if human.alive and (not human.sleeping or human.wake_at <= tick):
+            if tick >= human.thirsty_at:
+                self.thirsty.append(human)
+            elif tick >= human.hungry_at:
+                self.hungry.append(human)
+
+    def resolve_contacts(self):
+        # One pass over every target the humans went for this tick: act on the
+        # ones they reached, in the order they moved
+        found, seekers = self.contacts.detect()
+        for human, kind, target in found:
+            if kind == PUDDLE_CONTACT:
+                human.drink(self, target)
+            elif kind == ANIMAL_CONTACT:
+                human.eat_animal(self, target)
+            elif kind == PLANT_CONTACT:
+                human.eat_plant(self, target)
+            else:
+                human.mate_with(self, target)
+        for human in seekers:
+            self.flag_needs(human)
+
+    def move_animals(self):
+        # Every animal steps each tick while the whole world is near someone;
+        # otherwise animals in chunks far from all humans step less often or
+        # stay frozen, see chunks.ChunkMap
+        width, height = self.width, self.height
+        animal_grid = self.animal_grid
+        chunk_animals = self.chunks.animals
+        if self.chunks.all_active:
+            due = ((1, self.animals),)
+        else:
+            due = self.chunks.due_animals(self.tick)
+        for steps, animals in due:
+            for animal in animals:
+                old_x, old_y = animal.x, animal.y
+                animal.move(width, height, steps)
+                animal_grid.move(animal, old_x, old_y, animal.x, animal.y)
+                chunk_animals.move(animal, old_x, old_y, animal.x, animal.y)
+
+    def grids(self):
+        return {
+            'puddles': self.puddle_grid,
+            'plants': self.plant_grid,
+            'animals': self.animal_grid,
+            'males': self.mate_grids[MALE],
+            'females': self.mate_grids[FEMALE],
+        }
+
+    def rebalance_grids(self):
+        # Keep grid cells sized for the current crowd as populations change
+        self.plant_grid.rebalance()
+        self.animal_grid.rebalance()
+        for grid in self.mate_grids:
+            grid.rebalance()
+
+    def age_humans(self):
+        if self.tick - self.last_age_update >= AGE_INTERVAL:
+            self.last_age_update = self.tick
+            for human in self.active:
+                if human.alive:
+                    human.age += 1
+
+    def move_humans(self):
+        # Every human in the loop updates its stats and acts, in turn.
+        # Newborns added meanwhile wait until the next tick to act.
+        current_tick = self.tick
+        telemetry = self.telemetry
+        contacts = self.contacts
+        chunk_humans = self.chunks.humans
+        self.thirsty = []
+        self.hungry = []
+        for human in self.active:
+            old_x, old_y = human.x, human.y
+            was_awake = not human.sleeping
+            human.update_stats(current_tick, self.settings)
+            registered = len(contacts)
+            human.move(self)
+
+            # Keep the mate grids in step with waking, sleeping and dying
+            awake = human.alive and not human.sleeping
+            mate_grid = self.mate_grids[human.gender]
+            if was_awake and awake:
+                mate_grid.move(human, old_x, old_y, human.x, human.y)
+            elif was_awake:
+                mate_grid.remove(human, old_x, old_y)
+            elif awake:
+                mate_grid.insert(human)
+            chunk_humans.move(human, old_x, old_y, human.x, human.y)
+
+            if telemetry is not None:
+                if was_awake and human.sleeping:
+                    telemetry.record(current_tick, SLEEP, human)
+                elif not was_awake and not human.sleeping:
+                    telemetry.record(current_tick, WAKE, human)
+
+            # Humans that went for something are flagged once their contacts
+            # are resolved, as drinking or eating changes what they need
+            if len(contacts) == registered:
+                self.flag_needs(human)
+
+            if not human.alive:
+                if telemetry is not None:
+                    telemetry.record(current_tick, DEATH, human, death_cause(human))
+                self.genealogy.record_death(human.id, current_tick)
+                self.release_claims(human)
+                self.humans.remove(human)
+                self.active.remove(human)
+                chunk_humans.remove(human)
+            elif human.sleeping:
+                self.park(human, human.wake_at)
+            else:
+                self.park_if_idle(human)
+
+    def compact(self):
+        # Squeeze out everything that died or was eaten this tick
+        self.humans.compact()
+        self.active.compact()
+        self.animals.compact()
+
+    def respawn(self):
+        # Add new plants and animals every 60 seconds
+        if self.tick - self.last_respawn_time >= self.settings.respawn_interval:
+            self.last_respawn_time = self.tick
+            spawn = self.streams.spawn
+            for _ in range(self.settings.respawn_plants):
+                self.add_plant(spawn.randint(0, self.width), spawn.randint(0, self.height))
+            for _ in range(self.settings.respawn_animals):
+                self.add_animal(Animal(spawn.randint(0, self.width), spawn.randint(0, self.height), rng=spawn))
+
+    def step(self):
+        # Advance the world by one tick. Each phase is a method of its own,
+        # so instrument.Profiler and benchmark.py can time them.
+        self.tick += 1
+        self.wake_due()
+        self.age_humans()
+        self.batch_nearest()
+        self.assign_food()
+        self.move_humans()
+        self.resolve_contacts()
+        self.nearest_puddles = {}
+        self.compact()
+        self.move_animals()
+        self.respawn()
+        self.rebalance_grids()
+        if self.tick % ACTIVITY_INTERVAL == 0:
+            self.chunks.refresh()
+        if self.telemetry is not None:
+            self.telemetry.sample(self)
+
+    def run(self, ticks):
+        # Fast-forward: step as fast as possible, stopping early on extinction
+        for _ in range(ticks):
+            if not self.humans:
+                break
+            self.step()
+
+
+# Headless run: python simulation.py [ticks] [seed] [--size W H] [--profile N] [--checkpoint PATH] [--resume PATH] [--telemetry PREFIX]
+if __name__ == "__main__":
+    import argparse
+
+    # Use the importable module's classes rather than __main__'s, so that
+    # snapshots written here load from any other script
+    from simulation import World
+    import snapshot
+
+    parser = argparse.ArgumentParser(description="Run the simulation without a window")
+    parser.add_argument('ticks', type=int, nargs='?', default=3600, help="run until this tick")
+    parser.add_argument('seed', type=int, nargs='?')
+    parser.add_argument('--size', type=int, nargs=2, default=(WIDTH, HEIGHT), metavar=('W', 'H'), help="world size in pixels")
+    parser.add_argument('--profile', type=int, metavar='N', help="print phase timings every N ticks")
+    parser.add_argument('--checkpoint', metavar='PATH', help="save a snapshot here periodically and at the end")
+    parser.add_argument('--every', type=int, default=RESPAWN_INTERVAL, metavar='N', help="ticks between checkpoints")
+    parser.add_argument('--resume', metavar='PATH', help="continue from a snapshot instead of a new world")
+    parser.add_argument('--telemetry', metavar='PREFIX', help="write PREFIX-events.col and PREFIX-stats.col")
+    args = parser.parse_args()
+
+    if args.resume:
+        world = snapshot.load(args.resume, seed=args.seed)
+    else:
+        world = World(seed=args.seed, width=args.size[0], height=args.size[1])
+    if args.telemetry:
+        from telemetry import Telemetry
+
+        # A resumed run appends to the files the interrupted one wrote
+        world.telemetry = Telemetry(f"{args.telemetry}-events.col", f"{args.telemetry}-stats.col",
+                                    resume_tick=world.tick if args.resume else None)
+
+    if args.profile:
+        from instrument import Profiler, simulation_targets
+
+        profiler = Profiler()
+        profiler.enable(simulation_targets(World))
+        # Timings every args.profile ticks, checkpoints every args.every
+        # ticks as in snapshot.run_with_checkpoints, and both at the end
+        next_dump = world.tick + args.profile
+        while world.tick < args.ticks and world.humans:
+            stop = min(next_dump, args.ticks)
+            if args.checkpoint:
+                stop = min(stop, world.tick + args.every - world.tick % args.every)
+            world.run(stop - world.tick)
+            if world.tick >= next_dump or world.tick >= args.ticks or not world.humans:
+                profiler.dump(world)
+                next_dump = world.tick + args.profile
+            if args.checkpoint and (world.tick % args.every == 0 or world.tick >= args.ticks or not world.humans):
+                snapshot.checkpoint(world, args.checkpoint)
+        profiler.disable()
+    elif args.checkpoint:
+        snapshot.run_with_checkpoints(world, args.ticks, args.checkpoint, args.every)
+    else:
+        world.run(args.ticks - world.tick)
+    if world.telemetry is not None:
+        world.telemetry.close()
+    print(f"seed={world.streams.seed} tick={world.tick} ({world.tick / TICKS_PER_SECOND:.1f}s) humans={len(world.humans)} "
+          f"animals={len(world.animals)} plants={len(world.plants)}")
+    lineages = world.genealogy.lineage_stats()
+    surviving = sum(1 for line in lineages.values() if line['alive'])
+    print(f"ever born={len(world.genealogy)} max generation={world.max_generation} "
+          f"maternal lineages surviving={surviving}/{len(lineages)}")
@@ -0,0 +1,79 @@
+import os
+import pickle
+import struct
+import zlib
+
+# File header: magic, format version, then the zlib-compressed pickle of the
+# world. Bump FORMAT_VERSION whenever a change to the world's attributes makes
+# older snapshots unloadable.
+MAGIC = b'HSIM'
+FORMAT_VERSION = 12
+HEADER = struct.Struct('<4sH')
+# Fast compression; world state is mostly floats, which barely shrink more
+COMPRESSION_LEVEL = 1
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def dumps(world):
+    # The whole world in one pickle: entities, spatial grids, the clock, the
+    # settings and every RNG state. Pickle keeps shared references shared, so
+    # a human's target_animal is still the very animal in world.animals after
+    # loading.
+    body = pickle.dumps(world, protocol=pickle.HIGHEST_PROTOCOL)
+    return HEADER.pack(MAGIC, FORMAT_VERSION) + zlib.compress(body, COMPRESSION_LEVEL)
+
+
+def loads(data, seed=None, settings=None):
+    # Inverse of dumps. A seed or settings starts a fork that diverges from the
+    # saved run from the next tick on; without them the run continues exactly
+    # as it would have. Snapshots are pickles, so only load trusted files.
+    if len(data) < HEADER.size:
+        raise SnapshotError("not a simulation snapshot")
+    magic, version = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise SnapshotError("not a simulation snapshot")
+    if version != FORMAT_VERSION:
+        raise SnapshotError(f"snapshot format {version} is not supported (expected {FORMAT_VERSION})")
+    world = pickle.loads(zlib.decompress(data[HEADER.size:]))
+    if seed is not None:
+        world.reseed(seed)
+    if settings is not None:
+        world.apply_settings(settings)
+    return world
+
+
+def save(world, path):
+    # Write to a temporary file and rename it over the old snapshot, so a
+    # crash mid-write never leaves a truncated checkpoint behind
+    temp = f"{path}.tmp"
+    with open(temp, 'wb') as f:
+        f.write(dumps(world))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, path)
+
+
+def load(path, seed=None, settings=None):
+    with open(path, 'rb') as f:
+        return loads(f.read(), seed=seed, settings=settings)
+
+
+def checkpoint(world, path):
+    # Telemetry rows up to the checkpoint go to disk first, so a run resumed
+    # from it can append to the files without a gap
+    telemetry = getattr(world, 'telemetry', None)
+    if telemetry is not None:
+        telemetry.flush()
+    save(world, path)
+
+
+def run_with_checkpoints(world, ticks, path, every):
+    # Advance world to tick `ticks`, saving it to path every `every` ticks and
+    # at the end. Resume after a crash with load(path) and the same call.
+    while world.tick < ticks and len(world):
+        world.run(min(every - world.tick % every, ticks - world.tick))
+        checkpoint(world, path)
+    return world
@@ -0,0 +1,191 @@
+import math
+
+# Items per cell that rebalance() aims for, and the range it lets drift by
+TARGET_PER_CELL = 4
+REBALANCE_SLACK = 4
+MIN_CELL_SIZE = 4
+MAX_CELL_SIZE = 512
+
+
+# Position getters for the kinds of entities stored in a grid
+def object_position(item):
+    return item.x, item.y
+
+
+# Bucket keys: identity for objects, the value itself for int handles, whose
+# equal values are the same entity even when they are different int objects
+def identity_key(item):
+    return id(item)
+
+
+def value_key(item):
+    return item
+
+
+# SpatialGrid Class
+# Uniform grid (spatial hash) over the world. Items are bucketed by the cell
+# their position falls in, so nearest-neighbour and radius lookups only look at
+# the cells around the query point instead of every entity. Buckets are dicts
+# keyed by identity (or by key), so removal is O(1) and iteration keeps
+# insertion order.
+class SpatialGrid:
+    def __init__(self, cell_size=64, position=object_position, key=identity_key):
+        self.cell_size = cell_size
+        self.position = position
+        self.key = key
+        self.cells = {}
+        self.count = 0
+        # Nearest-neighbour queries run and items they looked at, read and
+        # reset by instrument.Profiler
+        self.queries = 0
+        self.scanned = 0
+        # Bounds of every cell ever used, so searches know when to stop
+        self.min_cx = self.min_cy = math.inf
+        self.max_cx = self.max_cy = -math.inf
+
+    def __len__(self):
+        return self.count
+
+    def insert(self, item, x=None, y=None):
+        if x is None:
+            x, y = self.position(item)
+        cs = self.cell_size
+        cx = int(x // cs)
+        cy = int(y // cs)
+        bucket = self.cells.get((cx, cy))
+        if bucket is None:
+            self.cells[(cx, cy)] = {self.key(item): item}
+            if cx < self.min_cx:
+                self.min_cx = cx
+            if cx > self.max_cx:
+                self.max_cx = cx
+            if cy < self.min_cy:
+                self.min_cy = cy
+            if cy > self.max_cy:
+                self.max_cy = cy
+        else:
+            bucket[self.key(item)] = item
+        self.count += 1
+
+    def remove(self, item, x=None, y=None):
+        # x, y must be the position the item was last inserted or moved at
+        if x is None:
+            x, y = self.position(item)
+        cs = self.cell_size
+        cell = (int(x // cs), int(y // cs))
+        bucket = self.cells[cell]
+        # Match by identity: equal-valued tuples may be different entities
+        del bucket[self.key(item)]
+        if not bucket:
+            del self.cells[cell]
+        self.count -= 1
+
+    def move(self, item, old_x, old_y, x, y):
+        # Only touch the buckets when the item crossed into another cell
+        cs = self.cell_size
+        if int(old_x // cs) != int(x // cs) or int(old_y // cs) != int(y // cs):
+            self.remove(item, old_x, old_y)
+            self.insert(item, x, y)
+
+    def clear(self):
+        self.cells.clear()
+        self.count = 0
+        self.min_cx = self.min_cy = math.inf
+        self.max_cx = self.max_cy = -math.inf
+
+    def rebalance(self):
+        # Re-bucket at a cell size that suits the current density, once it has
+        # drifted far from TARGET_PER_CELL. Only call this when every item sits
+        # in the cell of its current position, e.g. between ticks.
+        if not self.count:
+            return
+        cs = self.cell_size
+        used_cells = (self.max_cx - self.min_cx + 1) * (self.max_cy - self.min_cy + 1)
+        per_cell = self.count / used_cells
+        if TARGET_PER_CELL / REBALANCE_SLACK <= per_cell <= TARGET_PER_CELL * REBALANCE_SLACK:
+            return
+
+        area = used_cells * cs * cs
+        new_cs = math.sqrt(area * TARGET_PER_CELL / self.count)
+        new_cs = max(MIN_CELL_SIZE, min(MAX_CELL_SIZE, new_cs))
+        if new_cs == cs:
+            return
+
+        items = [item for bucket in self.cells.values() for item in bucket.values()]
+        self.clear()
+        self.cell_size = new_cs
+        for item in items:
+            self.insert(item)
+
+    def nearest(self, x, y, accept=None):
+        # Search rings of cells outwards from the query cell. Once the best hit
+        # is closer than the inner edge of the next ring nothing further out
+        # can beat it.
+        if not self.count:
+            return None
+
+        position = self.position
+        cells = self.cells
+        cs = self.cell_size
+        cx = int(x // cs)
+        cy = int(y // cs)
+        min_cx, max_cx = self.min_cx, self.max_cx
+        min_cy, max_cy = self.min_cy, self.max_cy
+        best = None
+        best_d2 = math.inf
+        scanned = 0
+        r = 0
+        while True:
+            for cell in self._ring(cx, cy, r):
+                bucket = cells.get(cell)
+                if bucket is None:
+                    continue
+                scanned += len(bucket)
+                for item in bucket.values():
+                    if accept is not None and not accept(item):
+                        continue
+                    ix, iy = position(item)
+                    d2 = (ix - x) * (ix - x) + (iy - y) * (iy - y)
+                    if d2 < best_d2:
+                        best = item
+                        best_d2 = d2
+
+            reach = r * cs
+            if ((best is not None and best_d2 <= reach * reach) or
+                    (cx - r <= min_cx and cx + r >= max_cx and cy - r <= min_cy and cy + r >= max_cy)):
+                self.queries += 1
+                self.scanned += scanned
+                return best
+            r += 1
+
+    # Pickling stores each bucket as a list in its iteration order, so a
+    # loaded grid breaks distance ties exactly as the saved one did
+    def __getstate__(self):
+        state = dict(vars(self))
+        state['cells'] = {cell: list(bucket.values()) for cell, bucket in self.cells.items()}
+        return state
+
+    def __setstate__(self, state):
+        vars(self).update(state)
+        key = self.key
+        self.cells = {cell: {key(item): item for item in bucket} for cell, bucket in state['cells'].items()}
+
+    def _ring(self, cx, cy, r):
+        # Cells at Chebyshev distance r from (cx, cy), clipped to the used bounds
+        if r == 0:
+            return [(cx, cy)]
+
+        min_cx, max_cx = self.min_cx, self.max_cx
+        min_cy, max_cy = self.min_cy, self.max_cy
+        x_range = range(max(cx - r, min_cx), min(cx + r, max_cx) + 1)
+        y_range = range(max(cy - r + 1, min_cy), min(cy + r - 1, max_cy) + 1)
+        ring = []
+        if min_cy <= cy - r <= max_cy:
+            ring += [(gx, cy - r) for gx in x_range]
+        if min_cy <= cy + r <= max_cy:
+            ring += [(gx, cy + r) for gx in x_range]
+        if min_cx <= cx - r <= max_cx:
+            ring += [(cx - r, gy) for gy in y_range]
+        if min_cx <= cx + r <= max_cx:
+            ring += [(cx + r, gy) for gy in y_range]
+        return ring
@@ -0,0 +1,25 @@
+import random
+
+# Subsystems that draw random numbers, each from its own stream so that a new
+# feature consuming numbers in one subsystem leaves the others untouched
+STREAMS = ('spawn', 'births', 'movement', 'breeding')
+
+
+# RandomStreams Class
+# One independent random.Random per subsystem, all derived from a single
+# simulation seed. Seeding from a string goes through SHA-512, so the streams
+# are the same on every platform and Python run.
+class RandomStreams:
+    def __init__(self, seed=None):
+        if seed is None:
+            seed = random.randrange(2 ** 63)
+        self.seed = seed
+        for name in STREAMS:
+            setattr(self, name, random.Random(f"{seed}:{name}"))
+
+    def getstate(self):
+        return {name: getattr(self, name).getstate() for name in STREAMS}
+
+    def setstate(self, state):
+        for name in STREAMS:
+            getattr(self, name).setstate(state[name])
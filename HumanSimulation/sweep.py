@@ -0,0 +1,126 @@
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from simulation import World, DEFAULT_SETTINGS, Settings
+
+SUMMARY_FIELDS = ('ticks', 'extinction_tick', 'peak_population', 'max_generation', 'final_population', 'seconds')
+
+
+def parse_param(text):
+    # "name=v1,v2,v3" -> ("name", [v1, v2, v3]), values parsed as JSON numbers
+    name, _, values = text.partition('=')
+    if not values:
+        raise argparse.ArgumentTypeError(f"expected name=v1,v2,... but got {text!r}")
+    if name not in DEFAULT_SETTINGS.as_dict():
+        raise argparse.ArgumentTypeError(f"unknown setting {name!r}")
+    return name, [json.loads(value) for value in values.split(',')]
+
+
+def run_id(params, seed, setup):
+    # Stable key for one run, used to skip finished runs on restart. setup
+    # holds the arguments every run shares (tick limit, engine, humans,
+    # snapshot), so a rerun with different ones into the same file is not
+    # mistaken for the runs already there.
+    return json.dumps({'params': params, 'seed': seed, **setup}, sort_keys=True)
+
+
+def run_simulation(params, seed, max_ticks, engine, sizes, start_from=None):
+    # One headless run to extinction or max_ticks; executed in a worker process
+    settings = Settings(**params)
+    start = time.perf_counter()
+    if start_from:
+        # Fork the saved world: its own settings with the swept ones on top,
+        # and fresh random streams so every seed diverges from the same state
+        import snapshot
+
+        world = snapshot.load(start_from, seed=seed)
+        world.apply_settings(Settings(**{**world.settings.as_dict(), **params}))
+    elif engine == 'vector':
+        from vector_engine import VectorWorld
+
+        world = VectorWorld(seed=seed, settings=settings, **sizes)
+    else:
+        world = World(seed=seed, settings=settings, **sizes)
+
+    peak = len(world)
+    while world.tick < max_ticks and len(world):
+        world.step()
+        peak = max(peak, len(world))
+
+    return {
+        'ticks': world.tick,
+        'extinction_tick': '' if len(world) else world.tick,
+        'peak_population': peak,
+        'max_generation': world.max_generation,
+        'final_population': len(world),
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+
+
+def finished_runs(path):
+    # Run ids already in the results table from an earlier, interrupted sweep
+    if not os.path.exists(path):
+        return set()
+    with open(path, newline='') as f:
+        return {row['run_id'] for row in csv.DictReader(f)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a grid of seeded headless simulations across all cores")
+    parser.add_argument('--param', type=parse_param, action='append', default=[], metavar='NAME=V1,V2',
+                        help="setting to vary, e.g. water_decay=0.04,0.05; repeat for more")
+    parser.add_argument('--seeds', type=int, default=4, help="seeds per parameter combination")
+    parser.add_argument('--ticks', type=int, default=60 * 60 * 60, help="run each world until this tick")
+    parser.add_argument('--engine', choices=('object', 'vector'), default='object')
+    parser.add_argument('--humans', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--output', default='sweep_results.csv')
+    parser.add_argument('--snapshot', help="start every run from this saved world instead of a new one")
+    args = parser.parse_args(argv)
+    if args.snapshot and args.engine == 'vector':
+        parser.error("--snapshot runs the engine the snapshot was saved from; it cannot be combined with --engine vector")
+
+    names = [name for name, _ in args.param]
+    scale = max(1, args.humans // 10)
+    sizes = {'num_humans': args.humans, 'num_puddles': 5 * scale, 'num_plants': 10 * scale, 'num_animals': 5 * scale}
+    setup = {'ticks': args.ticks, 'engine': args.engine, 'humans': args.humans, 'snapshot': args.snapshot}
+    runs = []
+    for values in itertools.product(*(values for _, values in args.param)):
+        params = dict(zip(names, values))
+        for seed in range(args.seeds):
+            runs.append((params, seed))
+
+    # Results are appended one row at a time, so an interrupted sweep can be
+    # restarted with the same arguments and only the missing runs are done
+    done = finished_runs(args.output)
+    pending = [(params, seed) for params, seed in runs if run_id(params, seed, setup) not in done]
+    print(f"{len(runs)} runs, {len(runs) - len(pending)} already done, {len(pending)} to go", flush=True)
+
+    columns = ['run_id', *names, 'seed', *SUMMARY_FIELDS]
+    write_header = not os.path.exists(args.output) or os.path.getsize(args.output) == 0
+    with open(args.output, 'a', newline='') as f, ProcessPoolExecutor(max_workers=args.workers) as pool:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        if write_header:
+            writer.writeheader()
+        futures = {
+            pool.submit(run_simulation, params, seed, args.ticks, args.engine, sizes, args.snapshot): (params, seed)
+            for params, seed in pending
+        }
+        for future in as_completed(futures):
+            params, seed = futures[future]
+            summary = future.result()
+            writer.writerow({'run_id': run_id(params, seed, setup), **params, 'seed': seed, **summary})
+            f.flush()
+            print(f"{params} seed={seed} -> {summary}", flush=True)
+    return 0
+
+
+# python sweep.py --param water_decay=0.04,0.05 --param breed_cooldown=1800,2700 --seeds 8
+if __name__ == "__main__":
+    sys.exit(main())
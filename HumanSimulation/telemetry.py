@@ -0,0 +1,261 @@
+import os
+import struct
+import sys
+from array import array
+
+# Event kinds
+BIRTH, DEATH, EAT, DRINK, SLEEP, WAKE = range(6)
+EVENT_NAMES = ('birth', 'death', 'eat', 'drink', 'sleep', 'wake')
+
+# Event details: the cause of a death or what was eaten
+NO_DETAIL, THIRST, STARVATION, EXHAUSTION, OLD_AGE, ANIMAL, PLANT = range(7)
+DETAIL_NAMES = ('', 'thirst', 'starvation', 'exhaustion', 'old_age', 'animal', 'plant')
+
+# (name, array typecode) of every column
+EVENT_COLUMNS = (
+    ('tick', 'I'), ('kind', 'B'), ('human', 'I'), ('detail', 'B'),
+    ('x', 'f'), ('y', 'f'), ('generation', 'I'),
+)
+STATS_COLUMNS = (
+    ('tick', 'I'), ('humans', 'I'), ('sleeping', 'I'), ('animals', 'I'), ('plants', 'I'),
+    ('births', 'I'), ('deaths', 'I'), ('max_generation', 'I'),
+    ('mean_water', 'f'), ('mean_hunger', 'f'), ('mean_energy', 'f'), ('mean_age', 'f'),
+)
+
+# Rows buffered per column before a batch is written out
+BATCH_ROWS = 65536
+
+# File layout: header, then any number of batches of rows. Each batch holds a
+# row count followed by every column's values back to back, little-endian,
+# so a reader can load one column without touching the others.
+MAGIC = b'HSCOL'
+FORMAT_VERSION = 1
+BATCH_HEADER = struct.Struct('<I')
+
+
+def death_cause(human):
+    # Mirrors the checks in Human.update_stats
+    if human.water <= 0:
+        return THIRST
+    if human.hunger <= 0:
+        return STARVATION
+    if human.energy <= 0:
+        return EXHAUSTION
+    return OLD_AGE
+
+
+# ColumnWriter Class
+# Append-only writer for one columnar file. Rows go into one array per column
+# and are written as a single batch once BATCH_ROWS have piled up, so the tick
+# loop only ever appends to arrays in memory.
+class ColumnWriter:
+    def __init__(self, path, columns, batch_rows=BATCH_ROWS, resume_tick=None, reload_after=None):
+        self.columns = columns
+        self.batch_rows = batch_rows
+        self.buffers = [array(typecode) for _, typecode in columns]
+        self.rows = 0
+        if resume_tick is not None and os.path.exists(path) and os.path.getsize(path):
+            self.file = self.reopen(path, resume_tick, resume_tick if reload_after is None else reload_after)
+            return
+        self.file = open(path, 'wb')
+        header = [MAGIC, struct.pack('<HH', FORMAT_VERSION, len(columns))]
+        for name, typecode in columns:
+            encoded = name.encode()
+            header.append(struct.pack('<B', len(encoded)) + encoded + typecode.encode())
+        self.file.write(b''.join(header))
+
+    def reopen(self, path, resume_tick, reload_after):
+        # Carry on with a file written by a run that is now resumed from its
+        # checkpoint at resume_tick. Rows of later ticks are dropped, since
+        # the resumed run writes them again, and so is a batch cut short by a
+        # crash. Rows are in tick order, so every batch that ends by
+        # reload_after stays on disk as it is, found from the tick column
+        # alone; the rows after it up to resume_tick are read back into the
+        # buffers, where the caller can look at them.
+        with open(path, 'rb') as f:
+            columns = _read_header(f, path)
+            if columns != list(self.columns):
+                raise ValueError(f"{path} has other columns than the ones being written")
+            end = f.tell()
+            for batch, batch_end in _batches(f, columns, ('tick',)):
+                if batch['tick'][-1] > reload_after:
+                    break
+                end = batch_end
+            f.seek(end)
+            for batch, _ in _batches(f, columns):
+                ticks = batch['tick']
+                keep = sum(1 for tick in ticks if tick <= resume_tick)
+                for buffer, (name, _) in zip(self.buffers, columns):
+                    buffer.extend(batch[name][:keep])
+                self.rows += keep
+                if keep < len(ticks):
+                    break
+        file = open(path, 'r+b')
+        file.truncate(end)
+        file.seek(end)
+        return file
+
+    def append(self, row):
+        for buffer, value in zip(self.buffers, row):
+            buffer.append(value)
+        self.rows += 1
+        if self.rows >= self.batch_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        chunks = [BATCH_HEADER.pack(self.rows)]
+        for buffer in self.buffers:
+            if sys.byteorder == 'big':
+                buffer.byteswap()
+            chunks.append(buffer.tobytes())
+        self.file.write(b''.join(chunks))
+        self.file.flush()
+        self.buffers = [array(typecode) for _, typecode in self.columns]
+        self.rows = 0
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def _read_header(f, path):
+    # Columns of an open file, leaving it at the first batch
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"{path} is not a telemetry file")
+    version, count = struct.unpack('<HH', f.read(4))
+    if version != FORMAT_VERSION:
+        raise ValueError(f"telemetry format {version} is not supported (expected {FORMAT_VERSION})")
+    columns = []
+    for _ in range(count):
+        length, = f.read(1)
+        name = f.read(length).decode()
+        typecode = f.read(1).decode()
+        columns.append((name, typecode))
+    return columns
+
+
+def _batches(f, columns, names=None):
+    # (batch, offset just past it) for every complete batch from the file's
+    # position on. Only the named columns are read; the file seeks past the
+    # others, so memory and reads scale with what is asked for.
+    size = os.fstat(f.fileno()).st_size
+    itemsizes = [array(typecode).itemsize for _, typecode in columns]
+    row_size = sum(itemsizes)
+    offset = f.tell()
+    while offset + BATCH_HEADER.size <= size:
+        rows, = BATCH_HEADER.unpack(f.read(BATCH_HEADER.size))
+        end = offset + BATCH_HEADER.size + rows * row_size
+        if end > size:
+            return
+        batch = {}
+        for (name, typecode), itemsize in zip(columns, itemsizes):
+            if names is not None and name not in names:
+                f.seek(rows * itemsize, os.SEEK_CUR)
+                continue
+            values = array(typecode)
+            values.frombytes(f.read(rows * itemsize))
+            if sys.byteorder == 'big':
+                values.byteswap()
+            batch[name] = values
+        offset = end
+        yield batch, end
+
+
+def read_batches(path, names=None):
+    # Yield {column name: array} per batch, of the named columns or all of
+    # them. A batch cut short by a crash mid-write is ignored.
+    with open(path, 'rb') as f:
+        columns = _read_header(f, path)
+        for batch, _ in _batches(f, columns, names):
+            yield batch
+
+
+def read_columns(path, names=None):
+    # Whole columns of a file, concatenated across batches
+    with open(path, 'rb') as f:
+        columns = _read_header(f, path)
+        result = {name: array(typecode) for name, typecode in columns if names is None or name in names}
+        for batch, _ in _batches(f, columns, names):
+            for name, values in batch.items():
+                result[name].extend(values)
+    return result
+
+
+# Telemetry Class
+# Event stream plus per-interval aggregates of one world. The world calls
+# record() as things happen and sample() once per tick; both only buffer rows
+# in memory, and ColumnWriter writes them out in large batches.
+#
+# A run resumed from a checkpoint passes the checkpoint's tick as
+# resume_tick to append to the files the interrupted run wrote, see
+# ColumnWriter.reopen, instead of starting them over.
+class Telemetry:
+    def __init__(self, events_path, stats_path, interval=60, resume_tick=None):
+        self.interval = interval
+        self.counts = [0] * len(EVENT_NAMES)
+        # Events since the last sample before the checkpoint still count
+        # towards the next one; they are among the rows reopening reads back
+        since = None if resume_tick is None else resume_tick - resume_tick % interval
+        self.events = ColumnWriter(events_path, EVENT_COLUMNS, resume_tick=resume_tick, reload_after=since)
+        self.stats = ColumnWriter(stats_path, STATS_COLUMNS, resume_tick=resume_tick)
+        ticks, kinds = self.events.buffers[:2]  # EVENT_COLUMNS starts with tick, kind
+        for tick, kind in zip(ticks, kinds):
+            if tick > since:
+                self.counts[kind] += 1
+
+    def record(self, tick, kind, human, detail=NO_DETAIL):
+        self.counts[kind] += 1
+        self.events.append((tick, kind, human.id, detail, human.x, human.y, human.generation))
+
+    def sample(self, world):
+        if world.tick % self.interval:
+            return
+        humans = world.humans
+        n = len(humans) or 1
+        water = hunger = energy = age = 0.0
+        sleeping = 0
+        current_stats = world.current_stats
+        for human in humans:
+            human_water, human_hunger, human_energy, human_age = current_stats(human)
+            water += human_water
+            hunger += human_hunger
+            energy += human_energy
+            age += human_age
+            sleeping += human.sleeping
+        self.stats.append((
+            world.tick, len(humans), sleeping, len(world.animals), len(world.plants),
+            self.counts[BIRTH], self.counts[DEATH], world.max_generation,
+            water / n, hunger / n, energy / n, age / n,
+        ))
+        self.counts = [0] * len(EVENT_NAMES)
+
+    def flush(self):
+        # Write out everything buffered, e.g. before a checkpoint
+        self.events.flush()
+        self.stats.flush()
+
+    def close(self):
+        self.events.close()
+        self.stats.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Summary of a telemetry file: python telemetry.py run-events.col
+if __name__ == "__main__":
+    from collections import Counter
+
+    for path in sys.argv[1:]:
+        columns = read_columns(path)
+        rows = len(next(iter(columns.values()), ()))
+        print(f"{path}: {rows} rows, columns {', '.join(columns)}")
+        if 'kind' in columns:
+            kinds = Counter(zip(columns['kind'], columns['detail']))
+            for (kind, detail), count in sorted(kinds.items()):
+                print(f"  {EVENT_NAMES[kind]:<6} {DETAIL_NAMES[detail]:<11} {count}")
@@ -0,0 +1,423 @@
+import zlib
+
+import numpy as np
+
+from simulation import (
+    WIDTH, HEIGHT, TICKS_PER_SECOND, AGE_INTERVAL, DEFAULT_SETTINGS, MALE, FEMALE,
+)
+from streams import STREAMS
+from proximity import DRINK_RANGE2, REACH2
+
+# Nearest-target queries against fewer candidates than this many pairs are
+# solved exactly with a chunked distance matrix; bigger ones go through a grid
+BRUTE_FORCE_PAIRS = 4_000_000
+# Candidates looked at per grid cell in the approximate search
+CANDIDATES_PER_CELL = 4
+# Ghost kinds of awake humans, by gender
+MATE_GHOSTS = ('males', 'females')
+
+
+def _nearest_brute(qx, qy, tx, ty):
+    # Exact nearest target for every query, a few rows of the matrix at a time
+    out = np.empty(len(qx), dtype=np.intp)
+    rows = max(1, BRUTE_FORCE_PAIRS // max(1, len(tx)))
+    for start in range(0, len(qx), rows):
+        end = start + rows
+        d2 = (qx[start:end, None] - tx[None, :]) ** 2 + (qy[start:end, None] - ty[None, :]) ** 2
+        out[start:end] = d2.argmin(axis=1)
+    return out
+
+
+def _nearest_grid(qx, qy, tx, ty):
+    # Approximate nearest target: bucket the targets into a uniform grid sized
+    # for a few targets per cell, then check a handful of targets in the 3x3
+    # cells around each query. Queries with nothing nearby fall back to the
+    # exact search.
+    min_x, min_y = tx.min(), ty.min()
+    extent = max(tx.max() - min_x, ty.max() - min_y, 1.0)
+    cell = max(extent / np.sqrt(len(tx) / 2), 1.0)
+    cols = int(extent // cell) + 1
+
+    tcx = ((tx - min_x) // cell).astype(np.int64)
+    tcy = ((ty - min_y) // cell).astype(np.int64)
+    keys = tcy * cols + tcx
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+
+    qcx = np.floor((qx - min_x) / cell).astype(np.int64)
+    qcy = np.floor((qy - min_y) / cell).astype(np.int64)
+    best = np.full(len(qx), -1, dtype=np.intp)
+    best_d2 = np.full(len(qx), np.inf)
+    last = len(tx) - 1
+    for ox in (-1, 0, 1):
+        for oy in (-1, 0, 1):
+            ncx = qcx + ox
+            ncy = qcy + oy
+            valid = (ncx >= 0) & (ncx < cols) & (ncy >= 0) & (ncy < cols)
+            key = ncy * cols + ncx
+            start = np.searchsorted(sorted_keys, key, side='left')
+            end = np.searchsorted(sorted_keys, key, side='right')
+            for j in range(CANDIDATES_PER_CELL):
+                pos = start + j
+                ok = valid & (pos < end)
+                cand = order[np.minimum(pos, last)]
+                d2 = (tx[cand] - qx) ** 2 + (ty[cand] - qy) ** 2
+                better = ok & (d2 < best_d2)
+                best[better] = cand[better]
+                best_d2[better] = d2[better]
+
+    missing = np.flatnonzero(best < 0)
+    if len(missing):
+        best[missing] = _nearest_brute(qx[missing], qy[missing], tx, ty)
+    return best
+
+
+def nearest_indices(qx, qy, tx, ty):
+    # Index into (tx, ty) of the nearest target for each query point
+    if len(qx) * len(tx) <= BRUTE_FORCE_PAIRS:
+        return _nearest_brute(qx, qy, tx, ty)
+    return _nearest_grid(qx, qy, tx, ty)
+
+
+# VectorWorld Class
+# Structure-of-arrays version of World: every per-agent attribute is a NumPy
+# array and each phase of a tick is applied to all agents at once. Agents act
+# simultaneously instead of one after another, so runs match the object
+# engine statistically rather than step for step.
+class VectorWorld:
+    HUMAN_FIELDS = (
+        'x', 'y', 'dx', 'dy', 'water', 'hunger', 'energy', 'age', 'death_age',
+        'gender', 'generation', 'sleeping', 'sleep_timer', 'change_direction_timer',
+        'last_breed_time',
+    )
+
+    def __init__(self, num_humans=10, num_puddles=5, num_plants=10, num_animals=5, seed=None, settings=DEFAULT_SETTINGS,
+                 width=WIDTH, height=HEIGHT):
+        self.reseed(seed)
+        spawn = self.rngs['spawn']
+        self.settings = settings
+        self.width = width
+        self.height = height
+
+        self.speed = 1
+        self.animal_speed = 0.6
+
+        self._clear_humans()
+        self.max_generation = 0
+        self.add_humans(
+            spawn.integers(0, width, num_humans, endpoint=True).astype(float),
+            spawn.integers(0, height, num_humans, endpoint=True).astype(float),
+            np.ones(num_humans, dtype=np.int64),
+        )
+
+        # Larger puddles, all the same size
+        self.puddle_x = spawn.integers(0, width, num_puddles, endpoint=True).astype(float)
+        self.puddle_y = spawn.integers(0, height, num_puddles, endpoint=True).astype(float)
+        self.plant_x = spawn.integers(0, width, num_plants, endpoint=True).astype(float)
+        self.plant_y = spawn.integers(0, height, num_plants, endpoint=True).astype(float)
+
+        self.animal_x = np.empty(0)
+        self.animal_y = np.empty(0)
+        self.animal_dx = np.empty(0)
+        self.animal_dy = np.empty(0)
+        self.add_animals(num_animals)
+
+        self.tick = 0
+        self.last_age_update = 0
+        self.last_respawn_time = 0
+        # Targets just across the borders of a shard, see shards.py; None
+        # for a world that is not split
+        self.ghosts = None
+
+    def __len__(self):
+        return len(self.x)
+
+    def reseed(self, seed):
+        # One generator per subsystem, as in streams.RandomStreams, keyed by
+        # name so that adding a stream never shifts the others
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+        self.seed = seed
+        self.rngs = {name: np.random.default_rng([seed, zlib.crc32(name.encode())]) for name in STREAMS}
+
+    def apply_settings(self, settings):
+        # Stats here are plain arrays updated every tick, so nothing to redo
+        self.settings = settings
+
+    def _clear_humans(self):
+        self.x = np.empty(0)
+        self.y = np.empty(0)
+        self.dx = np.empty(0)
+        self.dy = np.empty(0)
+        self.water = np.empty(0)
+        self.hunger = np.empty(0)
+        self.energy = np.empty(0)
+        self.age = np.empty(0, dtype=np.int64)
+        self.death_age = np.empty(0, dtype=np.int64)
+        self.gender = np.empty(0, dtype=np.int8)
+        self.generation = np.empty(0, dtype=np.int64)
+        self.sleeping = np.empty(0, dtype=bool)
+        self.sleep_timer = np.empty(0, dtype=np.int64)
+        self.change_direction_timer = np.empty(0, dtype=np.int64)
+        self.last_breed_time = np.empty(0, dtype=np.int64)
+
+    def add_humans(self, x, y, generation):
+        # Append a batch of newborns, mirroring Human.__init__
+        n = len(x)
+        rng = self.rngs['births']
+        fresh = {
+            'x': x,
+            'y': y,
+            'dx': rng.uniform(-1, 1, n),
+            'dy': rng.uniform(-1, 1, n),
+            'water': np.full(n, 100.0),
+            'hunger': np.full(n, 100.0),
+            'energy': np.full(n, 100.0),
+            'age': np.zeros(n, dtype=np.int64),
+            'death_age': rng.integers(self.settings.death_age_min, self.settings.death_age_max, n, endpoint=True),
+            'gender': rng.integers(0, 2, n).astype(np.int8),
+            'generation': generation,
+            'sleeping': np.zeros(n, dtype=bool),
+            'sleep_timer': np.zeros(n, dtype=np.int64),
+            'change_direction_timer': np.zeros(n, dtype=np.int64),
+            'last_breed_time': np.zeros(n, dtype=np.int64),
+        }
+        for field in self.HUMAN_FIELDS:
+            setattr(self, field, np.concatenate((getattr(self, field), fresh[field])))
+        if n:
+            self.max_generation = max(self.max_generation, int(generation.max()))
+
+    def add_animals(self, n):
+        rng = self.rngs['spawn']
+        self.animal_x = np.concatenate((self.animal_x, rng.integers(0, self.width, n, endpoint=True).astype(float)))
+        self.animal_y = np.concatenate((self.animal_y, rng.integers(0, self.height, n, endpoint=True).astype(float)))
+        self.animal_dx = np.concatenate((self.animal_dx, rng.uniform(-0.5, 0.5, n)))
+        self.animal_dy = np.concatenate((self.animal_dy, rng.uniform(-0.5, 0.5, n)))
+
+    def keep_humans(self, mask):
+        for field in self.HUMAN_FIELDS:
+            setattr(self, field, getattr(self, field)[mask])
+
+    def update_stats(self):
+        # Continue decreasing water and hunger even when sleeping
+        settings = self.settings
+        self.water -= settings.water_decay
+        self.hunger -= settings.hunger_decay
+
+        sleeping = self.sleeping.copy()
+        self.sleep_timer[sleeping] += 1
+        woke = sleeping & (self.sleep_timer >= 600)
+        self.energy[woke] = 100
+        self.sleeping[woke] = False
+        self.sleep_timer[woke] = 0
+
+        awake = ~sleeping
+        self.energy[awake] -= settings.energy_decay
+
+        # Only awake humans can die, as in Human.update_stats
+        dead = awake & (
+            (self.water <= 0) | (self.hunger <= 0) | (self.energy <= 0) | (self.age >= self.death_age)
+        )
+        return ~dead
+
+    def move_towards(self, idx, target_x, target_y):
+        direction_x = target_x - self.x[idx]
+        direction_y = target_y - self.y[idx]
+        distance = np.hypot(direction_x, direction_y)
+
+        moving = distance > 0
+        safe = np.where(moving, distance, 1.0)
+        self.dx[idx] = np.where(moving, direction_x / safe, self.dx[idx])
+        self.dy[idx] = np.where(moving, direction_y / safe, self.dy[idx])
+
+        self.x[idx] += self.dx[idx] * self.speed
+        self.y[idx] += self.dy[idx] * self.speed
+        # Squared distance left to the target, for the contact tests
+        left_x = self.x[idx] - target_x
+        left_y = self.y[idx] - target_y
+        return left_x * left_x + left_y * left_y
+
+    def random_movement(self, idx):
+        x = self.x[idx] + self.dx[idx] * self.speed
+        y = self.y[idx] + self.dy[idx] * self.speed
+        self.dx[idx] = bounce(x, self.dx[idx], self.width)
+        self.dy[idx] = bounce(y, self.dy[idx], self.height)
+        self.x[idx] = np.clip(x, 0, self.width)
+        self.y[idx] = np.clip(y, 0, self.height)
+
+        timer = self.change_direction_timer[idx] + 1
+        turn = timer >= 60
+        n = int(turn.sum())
+        if n:
+            turned = idx[turn]
+            self.dx[turned] = self.rngs['movement'].uniform(-1, 1, n)
+            self.dy[turned] = self.rngs['movement'].uniform(-1, 1, n)
+            timer[turn] = 0
+        self.change_direction_timer[idx] = timer
+
+    def targets(self, kind, x, y):
+        # Positions of one kind of target, followed in a shard by the ghosts
+        # of that kind across its borders. Ghosts can be headed for and
+        # drunk from, but food and mates stay with the shard that owns them.
+        if self.ghosts is None or not len(self.ghosts[kind][0]):
+            return x, y
+        ghost_x, ghost_y = self.ghosts[kind]
+        return np.concatenate((x, ghost_x)), np.concatenate((y, ghost_y))
+
+    def seek_water(self, idx):
+        puddle_x, puddle_y = self.targets('puddles', self.puddle_x, self.puddle_y)
+        if not len(idx) or not len(puddle_x):
+            return
+        target = nearest_indices(self.x[idx], self.y[idx], puddle_x, puddle_y)
+        distance2 = self.move_towards(idx, puddle_x[target], puddle_y[target])
+        self.water[idx[distance2 < DRINK_RANGE2]] = 100
+
+    def seek_food(self, idx):
+        # Animals are preferred while any are left, plants otherwise
+        # Ghost food sits past the end of the shard's own, and is only eaten
+        # once the human has crossed over to the shard that owns it
+        if not len(idx):
+            return
+        animal_x, animal_y = self.targets('animals', self.animal_x, self.animal_y)
+        plant_x, plant_y = self.targets('plants', self.plant_x, self.plant_y)
+        if len(animal_x):
+            target = nearest_indices(self.x[idx], self.y[idx], animal_x, animal_y)
+            distance2 = self.move_towards(idx, animal_x[target], animal_y[target])
+            eaters, eaten = first_claims(idx, target, (distance2 < REACH2) & (target < len(self.animal_x)))
+            self.hunger[eaters] = 100
+            keep = np.ones(len(self.animal_x), dtype=bool)
+            keep[eaten] = False
+            self.animal_x = self.animal_x[keep]
+            self.animal_y = self.animal_y[keep]
+            self.animal_dx = self.animal_dx[keep]
+            self.animal_dy = self.animal_dy[keep]
+        elif len(plant_x):
+            target = nearest_indices(self.x[idx], self.y[idx], plant_x, plant_y)
+            distance2 = self.move_towards(idx, plant_x[target], plant_y[target])
+            eaters, eaten = first_claims(idx, target, (distance2 < REACH2) & (target < len(self.plant_x)))
+            self.hunger[eaters] = np.minimum(100, self.hunger[eaters] + 20)
+            keep = np.ones(len(self.plant_x), dtype=bool)
+            keep[eaten] = False
+            self.plant_x = self.plant_x[keep]
+            self.plant_y = self.plant_y[keep]
+
+    def breed(self, idx, available):
+        # Each breeder heads for the nearest awake human of the other gender
+        births_x, births_y, births_gen = [], [], []
+        for gender in (MALE, FEMALE):
+            seekers = idx[self.gender[idx] == gender]
+            mates = np.flatnonzero(available & (self.gender != gender))
+            # A ghost mate is fine: the child is born on this side
+            mate_x, mate_y = self.targets(MATE_GHOSTS[FEMALE if gender == MALE else MALE], self.x[mates], self.y[mates])
+            if not len(seekers) or not len(mate_x):
+                continue
+            target = nearest_indices(self.x[seekers], self.y[seekers], mate_x, mate_y)
+            distance2 = self.move_towards(seekers, mate_x[target], mate_y[target])
+
+            parents = seekers[distance2 < REACH2]
+            n = len(parents)
+            if n:
+                # Create new humans at a random nearby position
+                rng = self.rngs['breeding']
+                births_x.append(self.x[parents] + rng.integers(-20, 20, n, endpoint=True))
+                births_y.append(self.y[parents] + rng.integers(-20, 20, n, endpoint=True))
+                births_gen.append(self.generation[parents] + 1)
+                self.last_breed_time[parents] = self.tick
+        return births_x, births_y, births_gen
+
+    def step(self):
+        # Advance the world by one tick
+        self.tick += 1
+        current_tick = self.tick
+
+        # Update age
+        if current_tick - self.last_age_update >= AGE_INTERVAL:
+            self.last_age_update = current_tick
+            self.age += 1
+
+        alive = self.update_stats()
+
+        # Priority: Water -> Food -> Sleep -> Breeding -> Roaming
+        active = alive & ~self.sleeping
+        thirsty = active & (self.water < 80)
+        hungry = active & ~thirsty & (self.hunger < 50)
+        tired = active & ~thirsty & ~hungry & (self.energy < 50)
+        rested = active & ~thirsty & ~hungry & ~tired
+        adult = rested & (self.age > 25)
+        breeding = adult & (current_tick - self.last_breed_time >= self.settings.breed_cooldown)
+        roaming = rested & ~adult
+
+        self.sleeping |= tired
+        available = alive & ~self.sleeping
+
+        self.seek_water(np.flatnonzero(thirsty))
+        self.seek_food(np.flatnonzero(hungry))
+        births = self.breed(np.flatnonzero(breeding), available)
+        self.random_movement(np.flatnonzero(roaming))
+
+        # Drop the dead in one pass, then append this tick's births
+        if not alive.all():
+            self.keep_humans(alive)
+        births_x, births_y, births_gen = births
+        if births_x:
+            self.add_humans(np.concatenate(births_x), np.concatenate(births_y), np.concatenate(births_gen))
+
+        self.move_animals()
+        self.respawn()
+
+    def move_animals(self):
+        x = self.animal_x + self.animal_dx * self.animal_speed
+        y = self.animal_y + self.animal_dy * self.animal_speed
+        self.animal_dx = bounce(x, self.animal_dx, self.width)
+        self.animal_dy = bounce(y, self.animal_dy, self.height)
+        self.animal_x = np.clip(x, 0, self.width)
+        self.animal_y = np.clip(y, 0, self.height)
+
+    def respawn(self):
+        # Add new plants and animals every 60 seconds
+        settings = self.settings
+        if self.tick - self.last_respawn_time >= settings.respawn_interval:
+            self.last_respawn_time = self.tick
+            spawn = self.rngs['spawn']
+            plants = settings.respawn_plants
+            self.plant_x = np.concatenate((self.plant_x, spawn.integers(0, self.width, plants, endpoint=True).astype(float)))
+            self.plant_y = np.concatenate((self.plant_y, spawn.integers(0, self.height, plants, endpoint=True).astype(float)))
+            self.add_animals(settings.respawn_animals)
+
+    def run(self, ticks):
+        # Fast-forward: step as fast as possible, stopping early on extinction
+        for _ in range(ticks):
+            if not len(self):
+                break
+            self.step()
+
+
+def bounce(position, velocity, limit):
+    # Reverse velocity for anything that went past a wall
+    return np.where((position < 0) | (position > limit), -velocity, velocity)
+
+
+def first_claims(idx, target, reached):
+    # Several seekers may reach the same target in one tick; the one earliest
+    # in the arrays gets it, like the first human to run in the object engine
+    winners = np.flatnonzero(reached)
+    claimed, first = np.unique(target[winners], return_index=True)
+    return idx[winners[first]], claimed
+
+
+# Headless run: python vector_engine.py [ticks] [humans] [seed]
+if __name__ == "__main__":
+    import sys
+    import time
+
+    ticks = int(sys.argv[1]) if len(sys.argv) > 1 else 3600
+    num_humans = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    scale = max(1, num_humans // 10)
+    world = VectorWorld(num_humans, num_puddles=5 * scale, num_plants=10 * scale, num_animals=5 * scale, seed=seed)
+    start = time.perf_counter()
+    world.run(ticks)
+    elapsed = time.perf_counter() - start
+    print(f"seed={world.seed} tick={world.tick} ({world.tick / TICKS_PER_SECOND:.1f}s) humans={len(world)} "
+          f"animals={len(world.animal_x)} plants={len(world.plant_x)} "
+          f"ticks/s={world.tick / elapsed:.0f}")